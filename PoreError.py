@@ -13,6 +13,11 @@ class ErrorPacking(PoreError):
         tri -- triangular
         sqr  -- square
         etri -- elongated triangular
+    for regular porous media and:
+        rnd -- random sequential addition
+        ls  -- growth and collective rearrangement
+        jt  -- Jodrey-Tory
+    for random porous media.
     """
     def __init__(self):
         """Just prints the error message"""
@@ -102,6 +107,15 @@ class ErrorLy(PoreError):
         msg = "Ly too small or negative."
         print (msg)
 
+class ErrorLz(PoreError):
+    """Exception when the depth is zero or negative."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "Lz must be None or greater than zero."
+        print (msg)
+
 class ErrorPorosity(PoreError):
     """Exception when porosity is zero, negative, or greater than 1."""
 
@@ -149,6 +163,25 @@ class ErrorSize(PoreError):
         msg = "Mesh size must be greater than zero."
         print (msg)
 
+class ErrorTransfinite(PoreError):
+    """Exception when the nodes per arc are not None or (nmin, nmax)."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "Nodes per arc must be None or integers 2 <= nmin <= nmax."
+        print (msg)
+
+class ErrorGmshBox(PoreError):
+    """Exception when discs cross the bounding box of a gmsh mesh."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "Discs cross the bounding box, which the 'gmsh' output " + \
+              "cannot cut: use meshtype 'gmsh_occ' or a larger box."
+        print (msg)
+
 class ErrorXoffset(PoreError):
     """Exception when the x offset is wrong."""
 
@@ -158,4 +191,136 @@ class ErrorXoffset(PoreError):
         msg = "Something is wrong with the x offset."
         print (msg)
 
+class ErrorBatchSize(PoreError):
+    """Exception when the number of candidates per batch is zero or negative."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "The batch size must be an integer greater than zero."
+        print (msg)
+
+class ErrorNprocs(PoreError):
+    """Exception when the number of processes is zero or negative."""
 
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "The number of processes must be an integer greater than zero."
+        print (msg)
+
+class ErrorSeed(PoreError):
+    """Exception when the seed is not None nor a non-negative integer."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "The seed must be None or an integer greater or equal to zero."
+        print (msg)
+
+class ErrorRng(PoreError):
+    """Exception when the random generator is not a np.random.Generator."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "The random generator must be a np.random.Generator."
+        print (msg)
+
+class ErrorDistribution(PoreError):
+    """Exception when the radius distribution is not a
+       PyDistribution.Distribution, has no radius in [rmin, rmax] or
+       cannot be saved in a checkpoint (not a class of PyDistribution)."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "Wrong radius distribution!"
+        print (msg)
+
+class ErrorBudget(PoreError):
+    """Exception when a time or trial budget is zero or negative."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "Budgets must be None or greater than zero."
+        print (msg)
+
+class ErrorStats(PoreError):
+    """Exception when the stats of a packing are not a PackingStats."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "stats must be None or a PyMonitor.PackingStats."
+        print (msg)
+
+class ErrorCheckpoint(PoreError):
+    """Exception when the checkpoint settings are wrong."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "checkpoint must be None or a file name and " + \
+              "checkpoint_interval greater than zero."
+        print (msg)
+
+class ErrorExtend(PoreError):
+    """Exception when a packing cannot be extended."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "Only 2D 'rnd' packings can be extended, by non-negative " + \
+              "lengths and along non-periodic directions."
+        print (msg)
+
+class ErrorRelax(PoreError):
+    """Exception when the 'ls' packing cannot relax the grains at any size."""
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        msg = "The 'ls' packing could not relax the overlaps: raise " + \
+              "target_porosity, lower tolerance or use the 'rnd' packing."
+        print (msg)
+
+class ErrorSchedule(PoreError):
+    """Exception when the order in which radii are placed is unknown.
+
+    The only allowed schedules are:
+        random -- radius and position drawn together
+        largest_first -- radius population placed in descending order
+    """
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        print ("Wrong schedule!")
+
+class ErrorSampling(PoreError):
+    """Exception when the sampling of grain centers is unknown.
+
+    The only allowed samplings are:
+        uniform -- uniform in the whole domain
+        void  -- uniform in the cells where a grain still fits
+    """
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        print ("Wrong sampling!")
+
+class ErrorParallel(PoreError):
+    """Exception when the parallel mode of the random packing is unknown.
+
+    The only allowed modes are:
+        tiles  -- strips of the domain packed in parallel
+        shared -- batches of candidates checked in parallel
+    """
+
+    def __init__(self):
+        """Just prints the error message"""
+        PoreError.__init__(self)
+        print ("Wrong parallel mode!")
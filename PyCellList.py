@@ -0,0 +1,672 @@
+"""Uniform-grid spatial index (cell list) for the random packings."""
+
+import numpy as np
+import PyKernels
+
+class CellList(object):
+    """Cell list. The rectangle [0,lx]x[0,ly] is split into square cells
+       and every cell keeps the indices of the grains whose center
+       lies inside it, so only nearby grains are checked for overlap.
+       Along periodic directions cells wrap around and distances are
+       computed with the minimum image convention."""
+#
+#-----------------------------------------------------------------------
+#
+    def __init__(self, lx, ly, cell_size, capacity=8,
+                 periodic=(False, False)):
+        """Creates an empty grid with cells of side cell_size.
+           periodic tells if x and y are periodic. Along a periodic
+           direction the cells are stretched to fit the length exactly,
+           so they are a bit larger than cell_size."""
+
+        self.cell_size = cell_size
+        self.lx = lx
+        self.ly = ly
+        self.periodic = tuple(periodic)
+        if self.periodic[0]:
+            self.ncx = max(1, int(lx//cell_size))
+        else:
+            self.ncx = max(1, int(np.ceil(lx/cell_size)))
+        if self.periodic[1]:
+            self.ncy = max(1, int(ly//cell_size))
+        else:
+            self.ncy = max(1, int(np.ceil(ly/cell_size)))
+        self.hx = lx/self.ncx if self.periodic[0] else cell_size
+        self.hy = ly/self.ncy if self.periodic[1] else cell_size
+
+        # Grain indices of each cell (-1 marks an empty slot).
+        self.cells = np.full((self.ncx, self.ncy, capacity), -1, dtype='int64')
+        self.count = np.zeros((self.ncx, self.ncy), dtype='int64')
+        # Distances computed by the overlap checks.
+        self.ndistances = 0
+#
+#-----------------------------------------------------------------------
+#
+    def cell_of(self, x, y):
+        """Returns the cell containing point (x, y)."""
+
+        ix = int(x//self.hx)
+        iy = int(y//self.hy)
+        if self.periodic[0]:
+            ix = ix % self.ncx
+        if self.periodic[1]:
+            iy = iy % self.ncy
+        ix = 0 if ix < 0 else (ix if ix < self.ncx else self.ncx - 1)
+        iy = 0 if iy < 0 else (iy if iy < self.ncy else self.ncy - 1)
+
+        return ix, iy
+#
+#-----------------------------------------------------------------------
+#
+    def insert(self, index, x, y):
+        """Adds grain index with center (x, y) to the grid."""
+
+        ix, iy = self.cell_of(x, y)
+        k = self.count[ix, iy]
+
+        if k == self.cells.shape[2]:
+            self._grow()
+
+        self.cells[ix, iy, k] = index
+        self.count[ix, iy] = k + 1
+#
+#-----------------------------------------------------------------------
+#
+    def insert_many(self, indices, x, y):
+        """Adds several grains at once. Grains falling in the same cell
+           are stored in the given order."""
+
+        if len(indices) == 0:
+            return
+
+        flat = self._flat_cells(x, y)
+        order = np.argsort(flat, kind='stable')
+        flat = flat[order]
+
+        # Position of every grain inside the group of its cell.
+        first = np.r_[0, np.flatnonzero(np.diff(flat)) + 1]
+        sizes = np.diff(np.r_[first, len(flat)])
+        rank = np.arange(len(flat)) - np.repeat(first, sizes)
+
+        count = self.count.ravel()
+        slot = count[flat] + rank
+
+        while slot.max() >= self.cells.shape[2]:
+            self._grow()
+
+        cells = self.cells.reshape(-1, self.cells.shape[2])
+        cells[flat, slot] = np.asarray(indices)[order]
+        self.count += np.bincount(flat, minlength=count.size).reshape(
+            self.count.shape)
+#
+#-----------------------------------------------------------------------
+#
+    def neighbours(self, x, y, reach):
+        """Returns the indices of the grains stored in the cells
+           that intersect the square of half side reach around (x, y)."""
+
+        if self.periodic[0] or self.periodic[1]:
+            nb = self.neighbours_batch(np.array([x]), np.array([y]), reach)[0]
+            return nb[nb >= 0]
+
+        i0, j0 = self.cell_of(x - reach, y - reach)
+        i1, j1 = self.cell_of(x + reach, y + reach)
+
+        block = self.cells[i0:i1 + 1, j0:j1 + 1, :].ravel()
+
+        return block[block >= 0]
+#
+#-----------------------------------------------------------------------
+#
+    def overlap(self, x, y, r, xx, yy, rr, tolerance, reach):
+        """Checks if disc (x, y, r) overlaps any of the grains
+           (xx, yy, rr) stored in the grid."""
+
+        if PyKernels.enabled:
+            hit, ndistances = PyKernels.compiled().overlap(
+                x, y, r, self.cells, self.count, self.hx, self.hy,
+                self.periodic[0], self.periodic[1], self.lx, self.ly,
+                xx, yy, rr, tolerance, reach)
+            self.ndistances = self.ndistances + ndistances
+            return hit
+
+        nb = self.neighbours(x, y, reach)
+        self.ndistances = self.ndistances + len(nb)
+
+        dx, dy = self.minimum_image(x - xx[nb], y - yy[nb])
+        radii_sum = r + rr[nb] + tolerance
+
+        return bool(np.any(dx*dx + dy*dy <= radii_sum*radii_sum))
+#
+#-----------------------------------------------------------------------
+#
+    def neighbours_batch(self, x, y, reach):
+        """Vectorized version of neighbours for arrays of points.
+           Row i holds the indices of the grains within reach of
+           (x[i], y[i]), padded with -1."""
+
+        jx, insidex = self._neighbour_cells(x, self.hx, self.ncx,
+                                            self.periodic[0], reach)
+        jy, insidey = self._neighbour_cells(y, self.hy, self.ncy,
+                                            self.periodic[1], reach)
+        inside = insidex[:, :, None] & insidey[:, None, :]
+
+        block = self.cells[jx[:, :, None], jy[:, None, :], :]
+        block = np.where(inside[:, :, :, None], block, -1)
+
+        return block.reshape(len(x), -1)
+#
+#-----------------------------------------------------------------------
+#
+    def overlap_batch(self, x, y, r, xx, yy, rr, tolerance, reach):
+        """Checks which of the discs (x, y, r) overlap any of the grains
+           (xx, yy, rr) stored in the grid."""
+
+        if len(xx) == 0:
+            return np.zeros(len(x), dtype=bool)
+
+        if PyKernels.enabled:
+            hits = np.empty(len(x), dtype=bool)
+            self.ndistances = self.ndistances + \
+                PyKernels.compiled().overlap_batch(
+                    x, y, r, hits, self.cells, self.count, self.hx, self.hy,
+                    self.periodic[0], self.periodic[1], self.lx, self.ly,
+                    xx, yy, rr, tolerance, reach)
+            return hits
+
+        nb = self.neighbours_batch(x, y, reach)
+        valid = nb >= 0
+        self.ndistances = self.ndistances + nb.size
+
+        dx, dy = self.minimum_image(x[:, None] - xx[nb], y[:, None] - yy[nb])
+        radii_sum = r[:, None] + rr[nb] + tolerance
+
+        return np.any(valid & (dx*dx + dy*dy <= radii_sum*radii_sum), axis=1)
+#
+#-----------------------------------------------------------------------
+#
+    def pairs(self, x, y, reach, nchunk=65536):
+        """Returns the candidate pairs (i, j), i < j, of grains stored
+           in the grid whose cells are within reach. (x, y) are the
+           centers of all stored grains, indexed as in the grid."""
+
+        first = []
+        second = []
+        for start in range(0, len(x), nchunk):
+            rows = np.arange(start, min(start + nchunk, len(x)))
+            nb = self.neighbours_batch(x[rows], y[rows], reach)
+            keep = nb > rows[:, None]
+            first.append(np.repeat(rows, keep.sum(axis=1)))
+            second.append(nb[keep])
+
+        if len(first) == 0:
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='int64')
+
+        return np.concatenate(first), np.concatenate(second)
+#
+#-----------------------------------------------------------------------
+#
+    def minimum_image(self, dx, dy):
+        """Returns the separations (dx, dy) folded to the nearest
+           periodic image."""
+
+        if self.periodic[0]:
+            dx = dx - self.lx*np.round(dx/self.lx)
+        if self.periodic[1]:
+            dy = dy - self.ly*np.round(dy/self.ly)
+
+        return dx, dy
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _neighbour_cells(x, h, nc, periodic, reach):
+        """Returns the cells along one direction within reach of every
+           point and a mask of the valid ones. Along a periodic direction
+           the cells wrap around (each cell is listed once)."""
+
+        n = int(np.ceil(reach/h))
+        i = np.floor(np.asarray(x)/h).astype('int64')
+
+        if periodic:
+            if 2*n + 1 >= nc:
+                j = np.broadcast_to(np.arange(nc), (len(i), nc))
+            else:
+                j = (i[:, None] % nc + np.arange(-n, n + 1)) % nc
+            return j, np.ones(j.shape, dtype=bool)
+
+        i = np.clip(i, 0, nc - 1)
+        j = i[:, None] + np.arange(-n, n + 1)
+        inside = (j >= 0) & (j < nc)
+
+        return np.clip(j, 0, nc - 1), inside
+#
+#-----------------------------------------------------------------------
+#
+    def _flat_cells(self, x, y):
+        """Returns the flat index of the cells containing the points."""
+
+        ix = np.floor(np.asarray(x)/self.hx).astype('int64')
+        iy = np.floor(np.asarray(y)/self.hy).astype('int64')
+        ix = ix % self.ncx if self.periodic[0] else np.clip(ix, 0, self.ncx - 1)
+        iy = iy % self.ncy if self.periodic[1] else np.clip(iy, 0, self.ncy - 1)
+
+        return ix*self.ncy + iy
+#
+#-----------------------------------------------------------------------
+#
+    def _grow(self):
+        """Doubles the number of slots per cell."""
+
+        capacity = self.cells.shape[2]
+        extra = np.full((self.ncx, self.ncy, capacity), -1, dtype='int64')
+        self.cells = np.concatenate((self.cells, extra), axis=2)
+#
+#-----------------------------------------------------------------------
+# END class CellList
+#-----------------------------------------------------------------------
+#
+
+class CellList3D(object):
+    """Cell list of the box [0,lx]x[0,ly]x[0,lz] for 3D packings of
+       spheres. Cells are cubes and keep the indices of the grains
+       whose center lies inside them."""
+#
+#-----------------------------------------------------------------------
+#
+    def __init__(self, lx, ly, lz, cell_size, capacity=8):
+        """Creates an empty grid with cells of side cell_size."""
+
+        self.cell_size = cell_size
+        self.ncx = max(1, int(np.ceil(lx/cell_size)))
+        self.ncy = max(1, int(np.ceil(ly/cell_size)))
+        self.ncz = max(1, int(np.ceil(lz/cell_size)))
+
+        # Grain indices of each cell (-1 marks an empty slot).
+        self.cells = np.full((self.ncx, self.ncy, self.ncz, capacity), -1,
+                             dtype='int64')
+        self.count = np.zeros((self.ncx, self.ncy, self.ncz), dtype='int64')
+        # Distances computed by the overlap checks.
+        self.ndistances = 0
+#
+#-----------------------------------------------------------------------
+#
+    def insert_many(self, indices, x, y, z):
+        """Adds several grains at once. Grains falling in the same cell
+           are stored in the given order."""
+
+        if len(indices) == 0:
+            return
+
+        flat = self._flat_cells(x, y, z)
+        order = np.argsort(flat, kind='stable')
+        flat = flat[order]
+
+        # Position of every grain inside the group of its cell.
+        first = np.r_[0, np.flatnonzero(np.diff(flat)) + 1]
+        sizes = np.diff(np.r_[first, len(flat)])
+        rank = np.arange(len(flat)) - np.repeat(first, sizes)
+
+        count = self.count.ravel()
+        slot = count[flat] + rank
+
+        while slot.max() >= self.cells.shape[3]:
+            self._grow()
+
+        cells = self.cells.reshape(-1, self.cells.shape[3])
+        cells[flat, slot] = np.asarray(indices)[order]
+        self.count += np.bincount(flat, minlength=count.size).reshape(
+            self.count.shape)
+#
+#-----------------------------------------------------------------------
+#
+    def neighbours_batch(self, x, y, z, reach):
+        """Row i holds the indices of the grains stored in the cells
+           within reach of (x[i], y[i], z[i]), padded with -1."""
+
+        h = self.cell_size
+        jx, insidex = CellList._neighbour_cells(x, h, self.ncx, False, reach)
+        jy, insidey = CellList._neighbour_cells(y, h, self.ncy, False, reach)
+        jz, insidez = CellList._neighbour_cells(z, h, self.ncz, False, reach)
+        inside = insidex[:, :, None, None] & insidey[:, None, :, None] & \
+                 insidez[:, None, None, :]
+
+        block = self.cells[jx[:, :, None, None], jy[:, None, :, None],
+                           jz[:, None, None, :], :]
+        block = np.where(inside[..., None], block, -1)
+
+        return block.reshape(len(x), -1)
+#
+#-----------------------------------------------------------------------
+#
+    def overlap_batch(self, x, y, z, r, xx, yy, zz, rr, tolerance, reach):
+        """Checks which of the spheres (x, y, z, r) overlap any of the
+           grains (xx, yy, zz, rr) stored in the grid."""
+
+        if len(xx) == 0:
+            return np.zeros(len(x), dtype=bool)
+
+        if PyKernels.enabled:
+            hits = np.empty(len(x), dtype=bool)
+            self.ndistances = self.ndistances + \
+                PyKernels.compiled().overlap_batch_3D(
+                    x, y, z, r, hits, self.cells, self.count,
+                    self.cell_size, xx, yy, zz, rr, tolerance, reach)
+            return hits
+
+        # Most of the 27 cells are empty or half full: only the stored
+        # grains are compared.
+        nb = self.neighbours_batch(x, y, z, reach)
+        i, k = np.nonzero(nb >= 0)
+        j = nb[i, k]
+        self.ndistances = self.ndistances + len(j)
+
+        dx = x[i] - xx[j]
+        dy = y[i] - yy[j]
+        dz = z[i] - zz[j]
+        radii_sum = r[i] + rr[j] + tolerance
+        hit = dx*dx + dy*dy + dz*dz <= radii_sum*radii_sum
+
+        return np.bincount(i[hit], minlength=len(x)) > 0
+#
+#-----------------------------------------------------------------------
+#
+    def _flat_cells(self, x, y, z):
+        """Returns the flat index of the cells containing the points."""
+
+        h = self.cell_size
+        ix = np.clip(np.floor(np.asarray(x)/h).astype('int64'), 0, self.ncx - 1)
+        iy = np.clip(np.floor(np.asarray(y)/h).astype('int64'), 0, self.ncy - 1)
+        iz = np.clip(np.floor(np.asarray(z)/h).astype('int64'), 0, self.ncz - 1)
+
+        return (ix*self.ncy + iy)*self.ncz + iz
+#
+#-----------------------------------------------------------------------
+#
+    def _grow(self):
+        """Doubles the number of slots per cell."""
+
+        capacity = self.cells.shape[3]
+        extra = np.full((self.ncx, self.ncy, self.ncz, capacity), -1,
+                        dtype='int64')
+        self.cells = np.concatenate((self.cells, extra), axis=3)
+#
+#-----------------------------------------------------------------------
+# END class CellList3D
+#-----------------------------------------------------------------------
+#
+
+class VoidGrid(object):
+    """Background grid used to sample grain centers only where a grain
+       of radius rmin still fits. A cell is retired when it is completely
+       covered by the exclusion disc (radius r + rmin + tolerance) of a
+       grain or lies in the band next to the walls. When most draws fail,
+       the active cells are split in four and covered children are
+       retired, so cells partly covered by several grains are also
+       removed."""
+#
+#-----------------------------------------------------------------------
+#
+    def __init__(self, lx, ly, rmin, tolerance, cells, grains, max_level=8,
+                 walls=(True, True, True, True), rng=None):
+        """Creates the grid. The cell diagonal is at most rmin.
+           cells (CellList) and grains (GrainStore) are used to find
+           the grains covering new cells when the grid is refined.
+           walls tells which sides (left, right, bottom, top) have
+           a wall band. rng (np.random.Generator) draws the samples."""
+
+        h = rmin/np.sqrt(2.)
+        self.lx = lx
+        self.ly = ly
+        self.ncx = max(1, int(np.ceil(lx/h)))
+        self.ncy = max(1, int(np.ceil(ly/h)))
+        self.clearance = rmin + tolerance
+        self.cells = cells
+        self.grains = grains
+        self.max_level = max_level
+        self.walls = walls
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.level = 0
+        self.misses = 0
+
+        ix, iy = np.divmod(np.arange(self.ncx*self.ncy), self.ncy)
+        keep = self._inside(ix, iy)
+        self.keys = (ix*self.ncy + iy)[keep]
+        self.alive = np.ones(len(self.keys), dtype=bool)
+        self._nalive = len(self.keys)
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def hx(self):
+        """Gets cell size in x at the current level."""
+
+        return self.lx/(self.ncx*2**self.level)
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def hy(self):
+        """Gets cell size in y at the current level."""
+
+        return self.ly/(self.ncy*2**self.level)
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def nactive(self):
+        """Gets number of cells that can still host a grain."""
+
+        return self._nalive
+#
+#-----------------------------------------------------------------------
+#
+    def sample(self, n):
+        """Returns n points drawn uniformly inside the active cells.
+           Empty arrays are returned when no cell is left."""
+
+        picked = np.empty(0, dtype='int64')
+
+        while len(picked) < n:
+
+            if len(self.keys) == 0:
+                return np.empty(0), np.empty(0)
+
+            new = self.rng.integers(0, len(self.keys), n - len(picked))
+            keep = self.alive[new]
+            picked = np.r_[picked, self.keys[new[keep]]]
+
+            # Retired cells are removed lazily.
+            if 2*np.count_nonzero(keep) < len(keep):
+                self._compact()
+
+        ix, iy = np.divmod(picked, self.ncy*2**self.level)
+        x = (ix + self.rng.uniform(0., 1., n))*self.hx
+        y = (iy + self.rng.uniform(0., 1., n))*self.hy
+
+        return x, y
+#
+#-----------------------------------------------------------------------
+#
+    def record(self, nfailed):
+        """Records failed draws. The grid is refined when there have been
+           twice as many failures as active cells since the last time.
+           At the finest level the remaining cells, whose free area is
+           negligible, are dropped and the packing is saturated."""
+
+        self.misses = self.misses + nfailed
+
+        if self.misses > 2*self.nactive:
+            if self.level < self.max_level:
+                self.refine()
+            else:
+                self.keys = np.empty(0, dtype='int64')
+                self.alive = np.empty(0, dtype=bool)
+                self._nalive = 0
+#
+#-----------------------------------------------------------------------
+#
+    def retire(self, x, y, r):
+        """Retires the cells covered by the exclusion discs of
+           grains (x, y, r)."""
+
+        x = np.atleast_1d(x)
+        y = np.atleast_1d(y)
+        reach = np.atleast_1d(r) + self.clearance
+        if len(x) == 0 or len(self.keys) == 0:
+            return
+
+        hx = self.hx
+        hy = self.hy
+        nyl = self.ncy*2**self.level
+
+        # Rows of cells crossed by every exclusion disc.
+        nrows = int(np.ceil(2.*reach.max()/hx)) + 2
+        ix = np.floor((x - reach)/hx).astype('int64')[:, None] + \
+             np.arange(nrows)
+        iy0 = np.maximum(np.floor((y - reach)/hy).astype('int64'), 0)
+        iy1 = np.minimum(np.floor((y + reach)/hy).astype('int64'), nyl - 1)
+
+        first = np.searchsorted(self.keys, ix*nyl + iy0[:, None])
+        last = np.searchsorted(self.keys, ix*nyl + iy1[:, None], 'right')
+        last = np.maximum(first, last)
+        sizes = (last - first).ravel()
+        if sizes.sum() == 0:
+            return
+
+        # Pairs (grain, active cell) to be tested.
+        grain = np.repeat(np.arange(len(x))[:, None], nrows, axis=1).ravel()
+        grain = np.repeat(grain, sizes)
+        start = np.repeat(first.ravel() - np.cumsum(np.r_[0, sizes[:-1]]),
+                          sizes)
+        index = start + np.arange(sizes.sum())
+
+        covered = self._covered(self.keys[index], x[grain], y[grain],
+                                reach[grain])
+        index = np.unique(index[covered])
+        self._nalive = self._nalive - np.count_nonzero(self.alive[index])
+        self.alive[index] = False
+#
+#-----------------------------------------------------------------------
+#
+    def refine(self):
+        """Splits every active cell in four and keeps the children
+           that are not covered by a single grain."""
+
+        self._compact()
+        nyl = self.ncy*2**self.level
+
+        ix, iy = np.divmod(self.keys, nyl)
+        ix = (2*ix[:, None] + np.array([0, 0, 1, 1])).ravel()
+        iy = (2*iy[:, None] + np.array([0, 1, 0, 1])).ravel()
+        self.level = self.level + 1
+        self.misses = 0
+
+        keep = self._inside(ix, iy)
+        ix = ix[keep]
+        iy = iy[keep]
+
+        # Children are checked in chunks to bound memory.
+        nchunk = 65536
+        free = np.ones(len(ix), dtype=bool)
+        for first in range(0, len(ix), nchunk):
+            chunk = slice(first, first + nchunk)
+            free[chunk] = ~self._covered_by_grains(ix[chunk], iy[chunk])
+
+        keys = ix[free]*(2*nyl) + iy[free]
+        self.keys = np.sort(keys)
+        self.alive = np.ones(len(self.keys), dtype=bool)
+        self._nalive = len(self.keys)
+#
+#-----------------------------------------------------------------------
+#
+    def state(self):
+        """Returns the active cells, level and failures as a dict of
+           arrays (see restore)."""
+
+        return {'keys':self.keys, 'alive':self.alive,
+                'counters':np.array([self.level, self.misses,
+                                     self._nalive])}
+#
+#-----------------------------------------------------------------------
+#
+    def restore(self, state):
+        """Continues from a state of a grid of the same domain."""
+
+        self.keys = np.array(state['keys'], dtype='int64')
+        self.alive = np.array(state['alive'], dtype=bool)
+        self.level, self.misses, self._nalive = [int(value) for value in
+                                                 state['counters']]
+#
+#-----------------------------------------------------------------------
+#
+    def _inside(self, ix, iy):
+        """Checks which cells are not completely in the wall bands."""
+
+        left, right, bottom, top = self.walls
+        clear = self.clearance
+        hx = self.hx
+        hy = self.hy
+
+        return (ix*hx + hx > left*clear) & \
+               (ix*hx < self.lx - right*clear) & \
+               (iy*hy + hy > bottom*clear) & \
+               (iy*hy < self.ly - top*clear)
+#
+#-----------------------------------------------------------------------
+#
+    def _covered(self, keys, x, y, reach):
+        """Checks if cells (given by key) lie inside the discs of
+           center (x, y) and radius reach."""
+
+        hx = self.hx
+        hy = self.hy
+        ix, iy = np.divmod(keys, self.ncy*2**self.level)
+
+        # Farthest corner of every cell from the disc center.
+        dx = np.maximum(np.abs(ix*hx - x), np.abs((ix + 1)*hx - x))
+        dy = np.maximum(np.abs(iy*hy - y), np.abs((iy + 1)*hy - y))
+
+        return dx*dx + dy*dy <= reach*reach
+#
+#-----------------------------------------------------------------------
+#
+    def _covered_by_grains(self, ix, iy):
+        """Checks if cells are covered by the exclusion disc of any of
+           the grains stored in the cell list."""
+
+        grains = self.grains
+        if len(ix) == 0 or grains.ngrains == 0:
+            return np.zeros(len(ix), dtype=bool)
+
+        hx = self.hx
+        hy = self.hy
+        xc = (ix + 0.5)*hx
+        yc = (iy + 0.5)*hy
+        rmax = grains.radius.max()
+
+        nb = self.cells.neighbours_batch(xc, yc, rmax + self.clearance)
+        valid = nb >= 0
+        xg = grains.x[nb]
+        yg = grains.y[nb]
+        reach = grains.radius[nb] + self.clearance
+
+        dx = np.maximum(np.abs(ix[:, None]*hx - xg),
+                        np.abs((ix[:, None] + 1)*hx - xg))
+        dy = np.maximum(np.abs(iy[:, None]*hy - yg),
+                        np.abs((iy[:, None] + 1)*hy - yg))
+
+        return np.any(valid & (dx*dx + dy*dy <= reach*reach), axis=1)
+#
+#-----------------------------------------------------------------------
+#
+    def _compact(self):
+        """Removes retired cells from the list of keys."""
+
+        self.keys = self.keys[self.alive]
+        self.alive = np.ones(len(self.keys), dtype=bool)
+#
+#-----------------------------------------------------------------------
+# END class VoidGrid
+#-----------------------------------------------------------------------
+#
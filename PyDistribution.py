@@ -0,0 +1,277 @@
+"""Grain size (radius) distributions for the random packings.
+
+   Every distribution is truncated to the [rmin, rmax] of the packing and
+   sampled in bulk by inverse transform: uniform numbers are mapped to
+   radii through a tabulated cumulative distribution, so n radii are
+   drawn with one vectorized call and no rejection.
+
+   A distribution of this module is saved as its class name and the
+   arguments of its __init__ (params), and rebuilt with from_params."""
+import numpy as np
+
+class Distribution(object):
+    """Base class. Children define the probability density of the
+       radius (_pdf) and the table is built from it."""
+
+    ntable = 4096
+
+    def __init__(self):
+
+        self._tables = {}
+#
+#-----------------------------------------------------------------------
+#
+    def sample(self, rng, n, rmin, rmax):
+        """Draws n radii in [rmin, rmax] with generator rng."""
+
+        radii, cdf = self._table(rmin, rmax)
+
+        return np.interp(rng.uniform(0., 1., n), cdf, radii)
+#
+#-----------------------------------------------------------------------
+#
+    def mean_area(self, rmin, rmax):
+        """Returns the mean area of the grains in [rmin, rmax]."""
+
+        radii, cdf = self._table(rmin, rmax)
+        area = np.pi*radii*radii
+
+        return np.sum(0.5*(area[1:] + area[:-1])*np.diff(cdf))
+#
+#-----------------------------------------------------------------------
+#
+    def _table(self, rmin, rmax):
+        """Returns the radii and the cumulative distribution at them,
+           computed once for every [rmin, rmax]."""
+
+        key = (rmin, rmax)
+        if key not in self._tables:
+
+            radii = np.linspace(rmin, rmax, self.ntable)
+            pdf = np.maximum(self._pdf(radii), 0.)
+            cdf = np.r_[0., np.cumsum(0.5*(pdf[1:] + pdf[:-1])*np.diff(radii))]
+            if not cdf[-1] > 0.:
+                import PoreError as PoreError
+                raise PoreError.ErrorDistribution
+
+            self._tables[key] = (radii, cdf/cdf[-1])
+
+        return self._tables[key]
+#
+#-----------------------------------------------------------------------
+#
+    def params(self):
+        """Returns the arguments of __init__, as plain numbers and
+           lists."""
+
+        return {}
+#
+#-----------------------------------------------------------------------
+#
+    def _pdf(self, radii):
+        """Defined by children."""
+
+        pass
+#
+#-----------------------------------------------------------------------
+# END class Distribution
+#-----------------------------------------------------------------------
+#
+
+class Uniform(Distribution):
+    """Uniform radii. Its inverse is exact, no table is needed."""
+#
+#-----------------------------------------------------------------------
+#
+    def sample(self, rng, n, rmin, rmax):
+        """Draws n radii in [rmin, rmax] with generator rng."""
+
+        return rng.uniform(rmin, rmax, n)
+#
+#-----------------------------------------------------------------------
+#
+    def mean_area(self, rmin, rmax):
+        """Returns the mean area of the grains in [rmin, rmax]."""
+
+        return np.pi*(rmin**2. + rmin*rmax + rmax**2.)/3.
+#
+#-----------------------------------------------------------------------
+# END class Uniform
+#-----------------------------------------------------------------------
+#
+
+class LogNormal(Distribution):
+    """Log-normal radii: log(r) is normal with mean mu and standard
+       deviation sigma (as in np.random.lognormal)."""
+
+    def __init__(self, mu, sigma):
+
+        super(LogNormal, self).__init__()
+        self.mu = mu
+        self.sigma = sigma
+#
+#-----------------------------------------------------------------------
+#
+    def params(self):
+        """Returns the arguments of __init__."""
+
+        return {'mu':float(self.mu), 'sigma':float(self.sigma)}
+#
+#-----------------------------------------------------------------------
+#
+    def _pdf(self, radii):
+        """Log-normal density."""
+
+        z = (np.log(radii) - self.mu)/self.sigma
+
+        return np.exp(-0.5*z*z)/radii
+#
+#-----------------------------------------------------------------------
+# END class LogNormal
+#-----------------------------------------------------------------------
+#
+
+class TruncatedNormal(Distribution):
+    """Normal radii with the given mean and standard deviation,
+       truncated to [rmin, rmax]."""
+
+    def __init__(self, mean, std):
+
+        super(TruncatedNormal, self).__init__()
+        self.mean = mean
+        self.std = std
+#
+#-----------------------------------------------------------------------
+#
+    def params(self):
+        """Returns the arguments of __init__."""
+
+        return {'mean':float(self.mean), 'std':float(self.std)}
+#
+#-----------------------------------------------------------------------
+#
+    def _pdf(self, radii):
+        """Normal density."""
+
+        z = (radii - self.mean)/self.std
+
+        return np.exp(-0.5*z*z)
+#
+#-----------------------------------------------------------------------
+# END class TruncatedNormal
+#-----------------------------------------------------------------------
+#
+
+class Discrete(Distribution):
+    """A few radii with their number fractions (weights), for
+       multi-modal packings. Radii out of [rmin, rmax] are dropped."""
+
+    def __init__(self, radii, weights):
+
+        super(Discrete, self).__init__()
+        self.radii = np.asarray(radii, dtype='float64')
+        self.weights = np.asarray(weights, dtype='float64')
+#
+#-----------------------------------------------------------------------
+#
+    def params(self):
+        """Returns the arguments of __init__."""
+
+        return {'radii':self.radii.tolist(), 'weights':self.weights.tolist()}
+#
+#-----------------------------------------------------------------------
+#
+    def sample(self, rng, n, rmin, rmax):
+        """Draws n radii in [rmin, rmax] with generator rng."""
+
+        radii, cdf = self._table(rmin, rmax)
+        pick = np.searchsorted(cdf, rng.uniform(0., 1., n), side='right')
+
+        return radii[np.minimum(pick, len(radii) - 1)]
+#
+#-----------------------------------------------------------------------
+#
+    def mean_area(self, rmin, rmax):
+        """Returns the mean area of the grains in [rmin, rmax]."""
+
+        radii, cdf = self._table(rmin, rmax)
+
+        return np.sum(np.pi*radii*radii*np.diff(np.r_[0., cdf]))
+#
+#-----------------------------------------------------------------------
+#
+    def _table(self, rmin, rmax):
+        """Returns the radii in [rmin, rmax] and their cumulative
+           fractions."""
+
+        key = (rmin, rmax)
+        if key not in self._tables:
+
+            keep = (self.radii >= rmin) & (self.radii <= rmax) & \
+                   (self.weights > 0.)
+            if not np.any(keep):
+                import PoreError as PoreError
+                raise PoreError.ErrorDistribution
+
+            cdf = np.cumsum(self.weights[keep])
+            self._tables[key] = (self.radii[keep], cdf/cdf[-1])
+
+        return self._tables[key]
+#
+#-----------------------------------------------------------------------
+# END class Discrete
+#-----------------------------------------------------------------------
+#
+
+class Sieve(Distribution):
+    """Empirical sieve curve: passing[k] is the fraction of the solid
+       (area in 2D) made of grains with diameter below diameters[k].
+       The curve is linear between sieves and converted to a number
+       density of radii, which is proportional to the area density
+       divided by the area of a grain."""
+
+    def __init__(self, diameters, passing):
+
+        super(Sieve, self).__init__()
+        self.diameters = np.asarray(diameters, dtype='float64')
+        self.passing = np.asarray(passing, dtype='float64')
+#
+#-----------------------------------------------------------------------
+#
+    def params(self):
+        """Returns the arguments of __init__."""
+
+        return {'diameters':self.diameters.tolist(),
+                'passing':self.passing.tolist()}
+#
+#-----------------------------------------------------------------------
+#
+    def _pdf(self, radii):
+        """Number density from the slope of the sieve curve."""
+
+        slope = np.diff(self.passing)/np.diff(self.diameters)
+        k = np.searchsorted(self.diameters, 2.*radii, side='right') - 1
+        inside = (k >= 0) & (k < len(slope))
+
+        density = np.where(inside, slope[np.clip(k, 0, len(slope) - 1)], 0.)
+
+        return density/(radii*radii)
+#
+#-----------------------------------------------------------------------
+# END class Sieve
+#-----------------------------------------------------------------------
+#
+
+def from_params(name, params):
+    """Returns the distribution of class name, one of this module,
+       built with params (see Distribution.params). Other names raise
+       ErrorDistribution, so no other code is run."""
+
+    classes = {'Uniform':Uniform, 'LogNormal':LogNormal,
+               'TruncatedNormal':TruncatedNormal, 'Discrete':Discrete,
+               'Sieve':Sieve}
+    if name not in classes:
+        import PoreError as PoreError
+        raise PoreError.ErrorDistribution
+
+    return classes[name](**params)
@@ -22,6 +22,11 @@ class PyGmsh(object):
         self._id_PlaneSurfaces = 0
         self._id_Physicals = 0
         self._TransfiniteLineValue = 20
+        self._physicals_by_name = {}
+        # (nmin, nmax) to set the nodes of every arc from its radius.
+        self.transfinite = None
+        # First arc, radii and mesh size of the circles added.
+        self._arcs = []
 
 
 #
@@ -85,22 +90,89 @@ class PyGmsh(object):
 
         lineloop = self.add_lineloop((arc1.line_id, arc2.line_id, \
             arc3.line_id, arc4.line_id))
-
-        grain_phys = self.find_physical("grains")
-        #import pdb; pdb.set_trace()
+        self._arcs.append((arc1.line_id, np.array([radius]), size))
 
         ids = [line_id + 1 for line_id in lineloop.ids]
-
-        if grain_phys == None:
-            self.add_physical("grains", ids, 'surf')
-
-        else:
-            grain_phys.add_lineloop(ids)
-
+        self._add_to_grains(ids)
 
         return
 #
 #-----------------------------------------------------------------------
+#
+    def add_circles(self, centers, radii, size, compact=False):
+        """ Adds many circles at once, as add_circle does for one.
+            centers is an array of shape (n, 3) and radii of length n.
+            Points, arcs and line loops are kept in arrays
+            (gmshPointArray, gmshCircleArray and gmshLineLoopArray)
+            instead of one object each. If compact is True only the
+            table of circles is written, and gmsh builds the same
+            entities with a loop (see gmshCircleTable)."""
+
+        from PyGmsh import gmshPointArray as gpa
+        from PyGmsh import gmshCircleArray as gca
+        from PyGmsh import gmshLineLoopArray as glla
+        from PyGmsh import gmshCircleTable as gct
+
+        centers = np.asarray(centers, dtype='float64').reshape(-1, 3)
+        radii = np.asarray(radii, dtype='float64')
+        n = len(radii)
+        if n == 0:
+            return
+
+        self._arcs.append((self._id_Lines + 1, radii, size))
+
+        if compact:
+            first_point = self._id_Points + 1
+            first_line = self._id_Lines + 1
+            first_loop = self._id_LineLoops + 1
+            self._id_Points = self._id_Points + 5*n
+            self._id_Lines = self._id_Lines + 4*n
+            self._id_LineLoops = self._id_LineLoops + n
+            self.Points.append(gct(first_point, first_line, first_loop,
+                                   centers, radii, size))
+
+            # Ranges of ids instead of lists.
+            self._add_to_planesurface(
+                ['{:d}:{:d}'.format(first_loop, self._id_LineLoops)])
+            self._add_to_grains(
+                ['{{{:d}:{:d}}}'.format(first_line + 1, self._id_Lines + 1)])
+            return
+
+        dx = radii*np.cos(np.pi/4.0)
+        dy = radii*np.sin(np.pi/4.0)
+        xc = centers[:, 0]
+        yc = centers[:, 1]
+
+        # Center and the 4 points of every circle, in the order of
+        # add_circle.
+        x = np.column_stack((xc, xc + dx, xc - dx, xc - dx, xc + dx))
+        y = np.column_stack((yc, yc + dy, yc + dy, yc - dy, yc - dy))
+        z = np.repeat(centers[:, 2], 5)
+
+        first_point = self._id_Points + 1
+        self._id_Points = self._id_Points + 5*n
+        self.Points.append(gpa(first_point, x.ravel(), y.ravel(), z, size))
+
+        center = first_point + 5*np.arange(n)
+        p1, p2, p3, p4 = [center + k for k in range(1, 5)]
+        arcs = np.stack((np.column_stack((p1, center, p2)),
+                         np.column_stack((p2, center, p3)),
+                         np.column_stack((p3, center, p4)),
+                         np.column_stack((p4, center, p1))), axis=1)
+
+        first_line = self._id_Lines + 1
+        self._id_Lines = self._id_Lines + 4*n
+        self.Lines.append(gca(first_line, arcs.reshape(-1, 3)))
+
+        line_ids = (first_line + np.arange(4*n)).reshape(n, 4)
+        first_loop = self._id_LineLoops + 1
+        self._id_LineLoops = self._id_LineLoops + n
+        self.LineLoops.append(glla(first_loop, line_ids))
+        self._add_to_planesurface(list(range(first_loop, first_loop + n)))
+
+        self._add_to_grains((line_ids.ravel() + 1).tolist())
+#
+#-----------------------------------------------------------------------
 #
     def add_line(self, p_ids, linetype='line'):
         """Adds one line to the mesh."""
@@ -120,23 +192,48 @@ class PyGmsh(object):
            The line loop is added to the plane surface list."""
 
         from PyGmsh import gmshLineLoop as gll
-        from PyGmsh import gmshPlaneSurface as gps
 
         self._id_LineLoops = self._id_LineLoops + 1
         lineloop = gll(self._id_LineLoops, line_ids)
         self.LineLoops.append(lineloop)
 
-        self._id_PlaneSurfaces = self._id_PlaneSurfaces + 1
-        if self._id_PlaneSurfaces < 2:
-            planesurface = gps(self._id_PlaneSurfaces, lineloop.lineloop_id)
-            self.PlaneSurface.append(planesurface)
-        else:
-            for planesurf in self.PlaneSurface:
-                planesurf.add_lineloop(lineloop.lineloop_id)
+        self._add_to_planesurface([lineloop.lineloop_id])
 
         return lineloop
 #
 #-----------------------------------------------------------------------
+#
+    def _add_to_planesurface(self, lineloops_ids):
+        """Adds line loops to the plane surface. The first line loop
+           ever added creates it."""
+
+        from PyGmsh import gmshPlaneSurface as gps
+
+        first = self._id_PlaneSurfaces
+        self._id_PlaneSurfaces = self._id_PlaneSurfaces + len(lineloops_ids)
+        if first < 1:
+            planesurface = gps(first + 1, lineloops_ids[0])
+            self.PlaneSurface.append(planesurface)
+            lineloops_ids = lineloops_ids[1:]
+
+        for planesurf in self.PlaneSurface:
+            planesurf.add_lineloops(lineloops_ids)
+#
+#-----------------------------------------------------------------------
+#
+    def _add_to_grains(self, ids):
+        """Adds line ids (shifted as out[] of the extrusion) to the
+           physical surface called grains, creating it if needed."""
+
+        grain_phys = self.find_physical("grains")
+
+        if grain_phys == None:
+            self.add_physical("grains", ids, 'surf')
+
+        else:
+            grain_phys.add_lineloop(ids)
+#
+#-----------------------------------------------------------------------
 #
     def add_physical(self, name, ids, phystype):
         """ Adds a physical surface to the mesh."""
@@ -147,20 +244,17 @@ class PyGmsh(object):
 
         phys = gphys(self._id_Physicals, name, ids, phystype)
         self.Physicals.append(phys)
+        self._physicals_by_name[name] = phys
 
         return phys
 #
 #-----------------------------------------------------------------------
 #
     def find_physical(self, name):
-        """ Returns id of the physical surface called name"""
-
-        phys_out = None
-        for phys in self.Physicals:
-            if phys.name == name:
-                phys_out = phys
+        """ Returns the physical surface called name (the last one
+            added), or None."""
 
-        return phys_out
+        return self._physicals_by_name.get(name)
 #
 #-----------------------------------------------------------------------
 #
@@ -191,29 +285,31 @@ class PyGmsh(object):
 #
 #-----------------------------------------------------------------------
 #
-    def write_code(self, fname):
-        """Writes the mesh in gmsh geo format."""
-        geo_code = [""]
+    def write_code(self, fname, nchunk=65536):
+        """Writes the mesh in gmsh geo format. Entities are written as
+           they are formatted, at most nchunk at a time, so the memory
+           used does not grow with the size of the mesh."""
 
-        for point in self.Points:
+        if fname == '':
+            fname = 'untitled.geo'
 
-            geo_code.append(point.code())
+        geo_file = open(fname, "w", buffering=1048576)
+
+        for point in self.Points:
+            self._write_entity(geo_file, point, nchunk)
 
         for line in self.Lines:
-            geo_code.append(line.code())
+            self._write_entity(geo_file, line, nchunk)
 
-        
         for lineloop in self.LineLoops:
-            geo_code.append(lineloop.code())
-
+            self._write_entity(geo_file, lineloop, nchunk)
 
         for psurf in self.PlaneSurface:
-            geo_code.append(psurf.code())
+            self._write_entity(geo_file, psurf, nchunk)
 
-        auxcode = 'Transfinite Line{5:' + str(self._id_Lines) + '} = ' + str(self._TransfiniteLineValue) + ';\n'
+        for auxcode in self._transfinite_codes(nchunk):
+            geo_file.write(auxcode)
 
-        geo_code.append(auxcode)
-                                                                           
         auxcode = """Recombine Surface{1};
 out[] = Extrude {0,  0,  1.0} {
         Surface{1};
@@ -221,28 +317,268 @@ out[] = Extrude {0,  0,  1.0} {
         Recombine;
        };\n"""
 
-        geo_code.append(auxcode)
+        geo_file.write(auxcode)
 
         for phys in self.Physicals:
-            geo_code.append(phys.code())
+            self._write_entity(geo_file, phys, nchunk)
 
 # The physical surface for the back of the box corresponds to
 # plane surface 1 (it does not fit in the Physicals object
 # which is assumed to be composed of lineloops).
 
         auxcode = "Physical Surface(\"back\") = {1};\n"
-        geo_code.append(auxcode)
+        geo_file.write(auxcode)
+
+        geo_file.close()
+#
+#-----------------------------------------------------------------------
+#
+    def _transfinite_codes(self, nchunk):
+        """Yields the transfinite lines of the arcs. By default every arc
+           gets _TransfiniteLineValue nodes. If transfinite is (nmin,
+           nmax), an arc of radius r gets ceil(pi*r/(2*size)) + 1 nodes,
+           so that its segments are not longer than size, bounded by nmin
+           and nmax. Arcs with the same number of nodes are written
+           together, as ranges of ids, nchunk ranges per line."""
+
+        if self.transfinite is None:
+            yield 'Transfinite Line{5:' + str(self._id_Lines) + '} = ' + str(self._TransfiniteLineValue) + ';\n'
+            return
+
+        if len(self._arcs) == 0:
+            return
+
+        nmin, nmax = self.transfinite
+        first = np.concatenate([line_id + 4*np.arange(len(radii)) \
+                                for line_id, radii, size in self._arcs])
+        nodes = np.concatenate([np.ceil(0.5*np.pi*radii/size) + 1 \
+                                for line_id, radii, size in self._arcs])
+        nodes = np.clip(nodes, nmin, nmax).astype('int64')
+
+        # Runs of circles with consecutive arcs and the same nodes.
+        order = np.lexsort((first, nodes))
+        first = first[order]
+        nodes = nodes[order]
+        breaks = (np.diff(first) != 4) | (np.diff(nodes) != 0)
+        start = np.r_[0, np.flatnonzero(breaks) + 1]
+        end = np.r_[start[1:], len(first)]
+        lows = first[start]
+        highs = first[end - 1] + 3
+        values = nodes[start]
+
+        for value in np.unique(values):
+            ranges = np.column_stack((lows, highs))[values == value]
+            for k in range(0, len(ranges), nchunk):
+                chunk = ranges[k:k + nchunk]
+                strids = ('%d:%d, '*len(chunk)) % tuple(chunk.ravel().tolist())
+                yield 'Transfinite Line{{{:s}}} = {:d};\n'.format(strids[:-2],
+                                                                 int(value))
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _write_entity(geo_file, entity, nchunk):
+        """Writes the code of an entity. Entities with a codes method
+           are written in pieces."""
+
+        if hasattr(entity, 'codes'):
+            for code in entity.codes(nchunk):
+                geo_file.write(code)
+        else:
+            geo_file.write(entity.code())
+
+#
+#-----------------------------------------------------------------------
+# END class PyGmsh
+#-----------------------------------------------------------------------
+#
+
+class PyGmshOCC(object):
+    """Gmsh wrapper to write porous media for the OpenCASCADE kernel of
+       gmsh. The grains are disks (spheres if is3D) removed from a
+       rectangle (box) with a single boolean difference. In 2D the
+       domain is extruded one layer, as PyGmsh does. Physical groups
+       get the same names as in PyGmsh and are found by bounding box.
+       OpenCASCADE cannot mesh a grain tangent to a side of the box, so
+       the sides no grain crosses are moved out to keep gap from the
+       grains; the grains are never changed."""
+#
+#-----------------------------------------------------------------------
+#
+    def __init__(self, is3D=False):
+        """Just creates empty arrays"""
+
+        self.is3D = is3D
+        self.pmin = None
+        self.pmax = None
+        self.size = None
+        self.gap = None
+        self.centers = np.empty((0, 3))
+        self.radii = np.empty(0)
+#
+#-----------------------------------------------------------------------
+#
+    def add_BoundingBox(self, pmin, pmax, size):
+        """Sets the box [pmin, pmax] of the domain (only its base
+           rectangle, at z = pmin[2], in 2D) and the mesh size. The gap
+           kept between grains and the sides they do not cross is a
+           tenth of size."""
+
+        self.pmin = [float(value) for value in pmin]
+        self.pmax = [float(value) for value in pmax]
+        self.size = size
+        self.gap = 0.1*size
+#
+#-----------------------------------------------------------------------
+#
+    def add_circles(self, centers, radii):
+        """Adds the grains: centers is an array of shape (n, 3) and
+           radii of length n. In 2D the disks lie on the plane of the
+           rectangle."""
+
+        centers = np.asarray(centers, dtype='float64').reshape(-1, 3)
+        self.centers = np.concatenate((self.centers, centers))
+        self.radii = np.concatenate((self.radii,
+                                     np.asarray(radii, dtype='float64')))
+#
+#-----------------------------------------------------------------------
+#
+    def write_code(self, fname, nchunk=65536):
+        """Writes the mesh in gmsh geo format. The grains are written
+           nchunk at a time."""
 
         if fname == '':
             fname = 'untitled.geo'
 
-        geo_file = open(fname, "w")
-        geo_file.write(''.join(geo_code))
+        pmin, pmax = self._padded_box()
+        x0, y0, z0 = pmin
+        x1, y1, z1 = pmax
+        n = len(self.radii)
+        entity = 'Volume' if self.is3D else 'Surface'
+
+        geo_file = open(fname, "w", buffering=1048576)
+        geo_file.write('SetFactory("OpenCASCADE");\n')
+
+        if self.is3D:
+            geo_file.write('Box(1) = {{{:.9f}, {:.9f}, {:.9f}, {:.9f}, '
+                           '{:.9f}, {:.9f}}};\n'.format(x0, y0, z0, x1 - x0,
+                                                       y1 - y0, z1 - z0))
+        else:
+            geo_file.write('Rectangle(1) = {{{:.9f}, {:.9f}, {:.9f}, '
+                           '{:.9f}, {:.9f}}};\n'.format(x0, y0, z0, x1 - x0,
+                                                       y1 - y0))
+
+        for code in self._grain_codes(nchunk):
+            geo_file.write(code)
+
+        if n > 0:
+            geo_file.write('domain[] = BooleanDifference{{ {0:s}{{1}}; Delete; }}'
+                           '{{ {0:s}{{2:{1:d}}}; Delete; }};\n'.format(entity,
+                                                                   n + 1))
+        else:
+            geo_file.write('domain[] = {1};\n')
+        geo_file.write('MeshSize{{ PointsOf{{ {:s}{{domain[]}}; }} }} = '
+                       '{:.9f};\n'.format(entity, self.size))
+
+        # In 2D the extrusion gives the front (out[0]) and the volumes.
+        if not self.is3D:
+            z1 = z0 + 1.0
+            geo_file.write("""Recombine Surface{domain[]};
+out[] = Extrude {0,  0,  1.0} {
+        Surface{domain[]};
+        Layers{1};
+        Recombine;
+       };
+""")
+
+        # Boundaries are the surfaces lying on the sides of the box.
+        # OpenCASCADE enlarges bounding boxes by its tolerance, so the
+        # slabs searched are a thousandth of the box thick.
+        eps = 1.e-3*max(x1 - x0, y1 - y0, z1 - z0)
+        sides = [('back', [x0, y0, z0, x1, y1, z0]),
+                 ('front', [x0, y0, z1, x1, y1, z1]),
+                 ('top', [x0, y1, z0, x1, y1, z1]),
+                 ('right', [x1, y0, z0, x1, y1, z1]),
+                 ('bottom', [x0, y0, z0, x1, y0, z1]),
+                 ('left', [x0, y0, z0, x0, y1, z1])]
+
+        for name, box in sides:
+            box = [value - eps for value in box[:3]] + \
+                  [value + eps for value in box[3:]]
+            geo_file.write(('{:s}[] = Surface In BoundingBox{{' +
+                            ', '.join(['{:.9f}']*6) + '}};\n').format(name,
+                                                                      *box))
+
+        geo_file.write('grains[] = Surface{:};\n')
+        for name, box in sides:
+            geo_file.write('grains[] -= {:s}[];\n'.format(name))
+
+        for name in ['front', 'top', 'right', 'bottom', 'left', 'grains',
+                     'back']:
+            geo_file.write('Physical Surface("{0:s}") = {{{0:s}[]}};\n'.format(
+                name))
+        geo_file.write('Physical Volume("internal") = Volume{:};\n')
+
         geo_file.close()
+#
+#-----------------------------------------------------------------------
+#
+    def _padded_box(self):
+        """Returns the box with the sides no grain crosses moved out
+           until they are gap away from the grains. Sides crossed by a
+           grain (periodic ones) are kept, with a warning if a grain is
+           nearly tangent to them."""
+
+        import warnings
+
+        ndim = 3 if self.is3D else 2
+        pmin = list(self.pmin)
+        pmax = list(self.pmax)
+        if len(self.radii) == 0:
+            return pmin, pmax
 
+        # Grains that only cross a side by round-off are tangent to it.
+        eps = 1.e-9*max(np.subtract(self.pmax, self.pmin))
+        for axis in range(ndim):
+            centers = self.centers[:, axis]
+            sides = [(pmin, -1., centers - self.radii - self.pmin[axis]),
+                     (pmax, 1., self.pmax[axis] - centers - self.radii)]
+            for side, sign, distance in sides:
+                nearest = np.min(distance)
+                if nearest >= -eps:
+                    side[axis] += sign*max(self.gap - nearest, 0.)
+                elif np.any(np.abs(distance) < self.gap):
+                    warnings.warn("A grain is nearly tangent to a side it "
+                                  "crosses: gmsh may fail to mesh it.")
+
+        return pmin, pmax
 #
 #-----------------------------------------------------------------------
-# END class PyGmsh
+#
+    def _grain_codes(self, nchunk):
+        """Yields the code of the disks (spheres), 2, 3, ..., nchunk at
+           a time."""
+
+        if self.is3D:
+            template = 'Sphere(%d) = {%.9f, %.9f, %.9f, %.9f};\n'
+            z = self.centers[:, 2]
+        else:
+            template = 'Disk(%d) = {%.9f, %.9f, %.9f, %.9f};\n'
+            z = np.full(len(self.radii), self.pmin[2])
+
+        for first in range(0, len(self.radii), nchunk):
+            last = min(first + nchunk, len(self.radii))
+            rows = np.empty((last - first, 5), dtype=object)
+            rows[:, 0] = range(first + 2, last + 2)
+            rows[:, 1] = self.centers[first:last, 0].tolist()
+            rows[:, 2] = self.centers[first:last, 1].tolist()
+            rows[:, 3] = z[first:last].tolist()
+            rows[:, 4] = self.radii[first:last].tolist()
+
+            yield (template*(last - first)) % tuple(rows.ravel())
+#
+#-----------------------------------------------------------------------
+# END class PyGmshOCC
 #-----------------------------------------------------------------------
 #
 
@@ -276,6 +612,52 @@ class gmshPoint(object):
 #-----------------------------------------------------------------------
 #
 
+class gmshPointArray(object):
+    """This class stores many points with consecutive ids in arrays
+       and writes their code in gmsh format, as gmshPoint does."""
+#
+#-----------------------------------------------------------------------
+#
+    def __init__(self, first_id, x, y, z, size):
+        """Creates the points first_id, first_id + 1, ... All of them
+           have the same size."""
+
+        self.first_id = first_id
+        self.x = x
+        self.y = y
+        self.z = z
+        self.size = size
+#
+#-----------------------------------------------------------------------
+#
+    def code(self):
+        """Returns the code for the points in gmsh format."""
+
+        return ''.join(self.codes(max(1, len(self.x))))
+#
+#-----------------------------------------------------------------------
+#
+    def codes(self, nchunk):
+        """Yields the code for the points, nchunk points at a time."""
+
+        for first in range(0, len(self.x), nchunk):
+            last = min(first + nchunk, len(self.x))
+            n = last - first
+            rows = np.empty((n, 5), dtype=object)
+            rows[:, 0] = range(self.first_id + first, self.first_id + last)
+            rows[:, 1] = self.x[first:last].tolist()
+            rows[:, 2] = self.y[first:last].tolist()
+            rows[:, 3] = self.z[first:last].tolist()
+            rows[:, 4] = self.size
+
+            yield ('Point(%d) = {%.9f, %.9f, %.9f, %.9f};\n'*n) % \
+                tuple(rows.ravel())
+#
+#-----------------------------------------------------------------------
+# END class gmshPointArray
+#-----------------------------------------------------------------------
+#
+
 class gmshLine(object):
     """This class creates and writes code for lines in gmsh format."""
 #
@@ -307,6 +689,44 @@ class gmshLine(object):
 #-----------------------------------------------------------------------
 #
 
+class gmshCircleArray(object):
+    """This class stores many arcs with consecutive ids in an array and
+       writes their code in gmsh format, as gmshLine does."""
+#
+#-----------------------------------------------------------------------
+#
+    def __init__(self, first_id, points_ids):
+        """Creates the arcs first_id, first_id + 1, ... points_ids has
+           one row (start, center, end) per arc."""
+
+        self.first_id = first_id
+        self.ids = points_ids
+#
+#-----------------------------------------------------------------------
+#
+    def code(self):
+        """Returns the code for the arcs in gmsh format."""
+
+        return ''.join(self.codes(max(1, len(self.ids))))
+#
+#-----------------------------------------------------------------------
+#
+    def codes(self, nchunk):
+        """Yields the code for the arcs, nchunk arcs at a time."""
+
+        for first in range(0, len(self.ids), nchunk):
+            last = min(first + nchunk, len(self.ids))
+            line_ids = np.arange(self.first_id + first, self.first_id + last)
+            rows = np.column_stack((line_ids, self.ids[first:last]))
+
+            yield ('Circle(%d) = {%d, %d, %d};\n'*len(rows)) % \
+                tuple(rows.ravel().tolist())
+#
+#-----------------------------------------------------------------------
+# END class gmshCircleArray
+#-----------------------------------------------------------------------
+#
+
 class gmshLineLoop(object):
     """This class creates and writes code for line loops in gmsh format."""
 #
@@ -335,6 +755,117 @@ class gmshLineLoop(object):
 #-----------------------------------------------------------------------
 #
 
+class gmshLineLoopArray(object):
+    """This class stores many line loops of four lines with consecutive
+       ids in an array and writes their code in gmsh format, as
+       gmshLineLoop does."""
+#
+#-----------------------------------------------------------------------
+#
+    def __init__(self, first_id, lines_ids):
+        """Creates the line loops first_id, first_id + 1, ... lines_ids
+           has one row of four lines per loop."""
+
+        self.first_id = first_id
+        self.ids = lines_ids
+#
+#-----------------------------------------------------------------------
+#
+    def code(self):
+        """Returns the code for the line loops in gmsh format."""
+
+        return ''.join(self.codes(max(1, len(self.ids))))
+#
+#-----------------------------------------------------------------------
+#
+    def codes(self, nchunk):
+        """Yields the code for the line loops, nchunk loops at a time."""
+
+        for first in range(0, len(self.ids), nchunk):
+            last = min(first + nchunk, len(self.ids))
+            lineloop_ids = np.arange(self.first_id + first,
+                                     self.first_id + last)
+            rows = np.column_stack((lineloop_ids, self.ids[first:last]))
+
+            yield ('Line Loop(%d) = {%d, %d, %d, %d};\n'*len(rows)) % \
+                tuple(rows.ravel().tolist())
+#
+#-----------------------------------------------------------------------
+# END class gmshLineLoopArray
+#-----------------------------------------------------------------------
+#
+
+class gmshCircleTable(object):
+    """This class writes many circles in gmsh format as a table of
+       centers and radii and a loop that builds, for every circle, the
+       same points, arcs and line loop (with the same ids) as
+       PyGmsh.add_circle. The file is several times smaller and faster
+       to parse."""
+#
+#-----------------------------------------------------------------------
+#
+    def __init__(self, first_point, first_line, first_lineloop, centers,
+                 radii, size):
+        """Creates the circles. Circle i gets the points first_point + 5i
+           (center) to first_point + 5i + 4, the arcs first_line + 4i to
+           first_line + 4i + 3 and the line loop first_lineloop + i."""
+
+        self.first_point = first_point
+        self.first_line = first_line
+        self.first_lineloop = first_lineloop
+        self.centers = centers
+        self.radii = radii
+        self.size = size
+#
+#-----------------------------------------------------------------------
+#
+    def code(self):
+        """Returns the code for the circles in gmsh format."""
+
+        return ''.join(self.codes(max(1, len(self.radii))))
+#
+#-----------------------------------------------------------------------
+#
+    def codes(self, nchunk):
+        """Yields the code for the circles. The table is written nchunk
+           circles at a time."""
+
+        n = len(self.radii)
+        for first in range(0, n, nchunk):
+            last = min(first + nchunk, n)
+            rows = np.column_stack((self.centers[first:last],
+                                    self.radii[first:last]))
+            table = ('%.9f, %.9f, %.9f, %.9f, '*(last - first)) % \
+                tuple(rows.ravel().tolist())
+            operator = '=' if first == 0 else '+='
+            yield 'Circles[] {:s} {{{:s}}};\n'.format(operator, table[:-2])
+
+        yield """For i In {{0:{:d}}}
+  px = Circles[4*i];
+  py = Circles[4*i + 1];
+  pz = Circles[4*i + 2];
+  pd = Circles[4*i + 3]*Cos(Pi/4);
+  p = {:d} + 5*i;
+  Point(p) = {{px, py, pz, {:.9f}}};
+  Point(p + 1) = {{px + pd, py + pd, pz, {:.9f}}};
+  Point(p + 2) = {{px - pd, py + pd, pz, {:.9f}}};
+  Point(p + 3) = {{px - pd, py - pd, pz, {:.9f}}};
+  Point(p + 4) = {{px + pd, py - pd, pz, {:.9f}}};
+  l = {:d} + 4*i;
+  Circle(l) = {{p + 1, p, p + 2}};
+  Circle(l + 1) = {{p + 2, p, p + 3}};
+  Circle(l + 2) = {{p + 3, p, p + 4}};
+  Circle(l + 3) = {{p + 4, p, p + 1}};
+  Line Loop({:d} + i) = {{l, l + 1, l + 2, l + 3}};
+EndFor
+""".format(n - 1, self.first_point, *([self.size]*5 +
+                                     [self.first_line, self.first_lineloop]))
+#
+#-----------------------------------------------------------------------
+# END class gmshCircleTable
+#-----------------------------------------------------------------------
+#
+
 class gmshPlaneSurface(object):
     """This class creates and writes code for plane surfaces in gmsh format."""
 #
@@ -355,15 +886,29 @@ class gmshPlaneSurface(object):
         self.ids.append(lineloops_ids)
 #
 #-----------------------------------------------------------------------
+#
+    def add_lineloops(self, lineloops_ids):
+        """Adds several line loops to the plane surface"""
+        self.ids.extend(lineloops_ids)
+#
+#-----------------------------------------------------------------------
 #
     def code(self):
         """Returns the code for a plane surface in gmsh format."""
 
-        strids = ', '.join(map(str, self.ids))
-        planesurface_code = 'Plane Surface({:d}) = {{{}}};'.format(
-            self.planesurface_id, strids)
+        return ''.join(self.codes(max(1, len(self.ids))))
+#
+#-----------------------------------------------------------------------
+#
+    def codes(self, nchunk):
+        """Yields the code for a plane surface, nchunk line loops at a
+           time."""
 
-        return planesurface_code + '\n'
+        yield 'Plane Surface({:d}) = {{'.format(self.planesurface_id)
+        for first in range(0, len(self.ids), nchunk):
+            strids = ', '.join(map(str, self.ids[first:first + nchunk]))
+            yield strids if first == 0 else ', ' + strids
+        yield '};\n'
 #
 #-----------------------------------------------------------------------
 # END class gmshPlaneSurface
@@ -395,26 +940,29 @@ class gmshPhysical(object):
 #
     def code(self):
         """Returns the code for a physical surface in gmsh format."""
-        from string import Template
-        outs = ''
-        out = Template('out[$n]')
-
-        for i in self.ids:
-            outs = outs + out.substitute(n=i) + ','
 
-        outs = outs[:-1] #removes last comma
+        return ''.join(self.codes(max(1, len(self.ids))))
+#
+#-----------------------------------------------------------------------
+#
+    def codes(self, nchunk):
+        """Yields the code for a physical surface, nchunk ids at a
+           time."""
 
         if self.phystype == 'surf':
 
-            physical_code = 'Physical Surface("{:s}") = {{{}}};'.format(
-                self.name, outs)
+            yield 'Physical Surface("{:s}") = {{'.format(self.name)
 
         elif self.phystype == 'vol':
 
-            physical_code = 'Physical Volume("{:s}") = {{{}}};'.format( \
-                self.name, outs)
+            yield 'Physical Volume("{:s}") = {{'.format(self.name)
 
-        return physical_code + '\n'
+        # Ids are numbers or gmsh lists ('{6:9}').
+        for first in range(0, len(self.ids), nchunk):
+            ids = self.ids[first:first + nchunk]
+            outs = ('out[%s],'*len(ids)) % tuple(ids)
+            yield outs[:-1] if first == 0 else ',' + outs[:-1]
+        yield '};\n'
 #
 #-----------------------------------------------------------------------
 # END class gmshPhysical
@@ -5,7 +5,10 @@ import numpy as np
 class Grain(object):
     """A grain."""
 
-    def __init__(self, rmin=0.1, rmax=0.3, lx=1., ly=1., tolerance=0.02):
+    def __init__(self, rmin=0.1, rmax=0.3, lx=1., ly=1., tolerance=0.02,
+                 rng=None):
+        """Draws a grain. rng (np.random.Generator) defaults to the
+           global numpy random state."""
 
         self._x = None
         self._y = None
@@ -13,9 +16,12 @@ class Grain(object):
         self._area = None
         self._tolerance = None
 
-        self.x = np.random.uniform(0.0, lx)
-        self.y = np.random.uniform(0.0, ly)
-        self.radius = np.random.uniform(rmin, rmax)
+        if rng is None:
+            rng = np.random
+
+        self.x = rng.uniform(0.0, lx)
+        self.y = rng.uniform(0.0, ly)
+        self.radius = rng.uniform(rmin, rmax)
         #aa = np.exp(np.random.lognormal(1.,1.,1))
         
         self.area = np.pi*self.radius*self.radius
@@ -150,3 +156,122 @@ class Grain(object):
 # END class Grain
 #-----------------------------------------------------------------------
 #
+
+class GrainStore(object):
+    """Growable store of grains. The fields x, y, z, r and area are the
+       rows of one preallocated (5, capacity) array, so each of them is
+       contiguous, and the capacity is doubled when it is full. Columns
+       are views of it; circles is built when asked for."""
+
+    fields = ('x', 'y', 'z', 'r', 'area')
+
+    def __init__(self, capacity=1024):
+
+        self._columns = np.zeros((len(self.fields), max(1, capacity)))
+        self._ngrains = 0
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def ngrains(self):
+        """Gets number of stored grains."""
+
+        return self._ngrains
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def x(self):
+        """Gets x coordinates of the centers."""
+
+        return self._columns[0, :self._ngrains]
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def y(self):
+        """Gets y coordinates of the centers."""
+
+        return self._columns[1, :self._ngrains]
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def z(self):
+        """Gets z coordinates of the centers."""
+
+        return self._columns[2, :self._ngrains]
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def radius(self):
+        """Gets grain radii."""
+
+        return self._columns[3, :self._ngrains]
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def area(self):
+        """Gets grain areas."""
+
+        return self._columns[4, :self._ngrains]
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def circles(self):
+        """Gets a copy of the grains as a circles array (fields x, y, z
+           and r)."""
+
+        circles = np.zeros(self._ngrains,
+                           dtype={'names':['x', 'y', 'z', 'r'],
+                                  'formats':['float64']*4})
+        circles['x'] = self.x
+        circles['y'] = self.y
+        circles['z'] = self.z
+        circles['r'] = self.radius
+
+        return circles
+#
+#-----------------------------------------------------------------------
+#
+    def append(self, x, y, z, radius):
+        """Adds one or several grains. Returns their indices."""
+
+        x = np.atleast_1d(x)
+        nnew = len(x)
+        first = self._ngrains
+        last = first + nnew
+
+        if last > self._columns.shape[1]:
+            self._reserve(last)
+
+        new = self._columns[:, first:last]
+        new[0] = x
+        new[1] = y
+        new[2] = z
+        new[3] = radius
+        new[4] = np.pi*new[3]*new[3]
+        self._ngrains = last
+
+        return np.arange(first, last)
+#
+#-----------------------------------------------------------------------
+#
+    def _reserve(self, capacity):
+        """Doubles the capacity until capacity grains fit."""
+
+        size = self._columns.shape[1]
+        while size < capacity:
+            size = 2*size
+
+        columns = np.zeros((len(self.fields), size))
+        columns[:, :self._ngrains] = self._columns[:, :self._ngrains]
+        self._columns = columns
+#
+#-----------------------------------------------------------------------
+# END class GrainStore
+#-----------------------------------------------------------------------
+#
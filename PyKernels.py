@@ -0,0 +1,345 @@
+"""Overlap kernels of the random packings compiled with numba.
+
+   numba is optional. Whether it is installed is checked when this
+   module is imported, without importing it; the kernels are compiled
+   (and cached on disk) the first time they are used. Without numba, or
+   with enabled set to False, the cell lists keep their NumPy code. Both
+   give the same overlaps: the kernels compute the same float64
+   distances, only without building arrays for every candidate.
+
+   The loop of the Jodrey-Tory packing (jt_pack) is a kernel too.
+   Without numba the same function runs as plain Python, on lists."""
+import heapq
+import importlib.util
+import math
+import numpy as np
+
+available = importlib.util.find_spec('numba') is not None
+enabled = available
+
+_compiled = None
+
+def compiled():
+    """Returns the compiled kernels (see _Kernels), compiling them the
+       first time."""
+
+    global _compiled
+
+    if _compiled is None:
+        _compiled = _Kernels()
+
+    return _compiled
+#
+#-----------------------------------------------------------------------
+#
+class _Kernels(object):
+    """The functions of this module, compiled with numba.njit. They are
+       compiled in their own namespace so that they call the compiled
+       versions of each other."""
+
+    def __init__(self):
+
+        import types
+        import numba
+
+        namespace = {'__name__':__name__, 'heapq':heapq, 'math':math,
+                     'np':np}
+        for name in ['_cell_range', 'overlap', 'overlap_batch',
+                     'overlap_batch_3D', 'first_fit', '_jt_cell', '_jt_move',
+                     '_jt_push', 'jt_pack']:
+            function = globals()[name]
+            function = types.FunctionType(function.__code__, namespace, name)
+            namespace[name] = numba.njit(cache=True)(function)
+            setattr(self, name, namespace[name])
+#
+#-----------------------------------------------------------------------
+# END class _Kernels
+#-----------------------------------------------------------------------
+#
+def _cell_range(x, h, nc, periodic, reach):
+    """First cell and number of cells along one direction within reach
+       of x, as listed by CellList._neighbour_cells."""
+
+    n = int(math.ceil(reach/h))
+    i = int(math.floor(x/h))
+
+    if periodic:
+        if 2*n + 1 >= nc:
+            return 0, nc
+        return i - n, 2*n + 1
+
+    i = min(max(i, 0), nc - 1)
+    first = max(i - n, 0)
+
+    return first, min(i + n, nc - 1) - first + 1
+#
+#-----------------------------------------------------------------------
+#
+def overlap(x, y, r, cells, count, hx, hy, periodic_x, periodic_y, lx, ly,
+            xx, yy, rr, tolerance, reach):
+    """Checks if disc (x, y, r) overlaps any of the grains (xx, yy, rr)
+       stored in the 2D cell list (cells, count) of cell sides hx, hy.
+       Returns it and the number of distances computed."""
+
+    ncx = count.shape[0]
+    ncy = count.shape[1]
+    fx, nx = _cell_range(x, hx, ncx, periodic_x, reach)
+    fy, ny = _cell_range(y, hy, ncy, periodic_y, reach)
+    ndistances = 0
+
+    for a in range(nx):
+        ix = (fx + a) % ncx
+        for b in range(ny):
+            iy = (fy + b) % ncy
+            for k in range(count[ix, iy]):
+                g = cells[ix, iy, k]
+                dx = x - xx[g]
+                dy = y - yy[g]
+                # np.round of CellList.minimum_image is np.rint.
+                if periodic_x:
+                    dx = dx - lx*np.rint(dx/lx)
+                if periodic_y:
+                    dy = dy - ly*np.rint(dy/ly)
+                radii_sum = r + rr[g] + tolerance
+                ndistances = ndistances + 1
+                if dx*dx + dy*dy <= radii_sum*radii_sum:
+                    return True, ndistances
+
+    return False, ndistances
+#
+#-----------------------------------------------------------------------
+#
+def overlap_batch(x, y, r, hits, cells, count, hx, hy, periodic_x,
+                  periodic_y, lx, ly, xx, yy, rr, tolerance, reach):
+    """Vectorized version of overlap: hits[i] tells if disc i overlaps.
+       Returns the number of distances computed."""
+
+    ndistances = 0
+    for i in range(len(x)):
+        hits[i], n = overlap(x[i], y[i], r[i], cells, count, hx, hy,
+                             periodic_x, periodic_y, lx, ly, xx, yy, rr,
+                             tolerance, reach)
+        ndistances = ndistances + n
+
+    return ndistances
+#
+#-----------------------------------------------------------------------
+#
+def overlap_batch_3D(x, y, z, r, hits, cells, count, h, xx, yy, zz, rr,
+                     tolerance, reach):
+    """hits[i] tells if sphere i overlaps any of the grains stored in
+       the 3D cell list (cells, count) of cell side h. Returns the
+       number of distances computed."""
+
+    ncx = count.shape[0]
+    ncy = count.shape[1]
+    ncz = count.shape[2]
+    ndistances = 0
+
+    for i in range(len(x)):
+        fx, nx = _cell_range(x[i], h, ncx, False, reach)
+        fy, ny = _cell_range(y[i], h, ncy, False, reach)
+        fz, nz = _cell_range(z[i], h, ncz, False, reach)
+        hits[i] = False
+        for a in range(fx, fx + nx):
+            for b in range(fy, fy + ny):
+                for c in range(fz, fz + nz):
+                    for k in range(count[a, b, c]):
+                        g = cells[a, b, c, k]
+                        dx = x[i] - xx[g]
+                        dy = y[i] - yy[g]
+                        dz = z[i] - zz[g]
+                        radii_sum = r[i] + rr[g] + tolerance
+                        ndistances = ndistances + 1
+                        if dx*dx + dy*dy + dz*dz <= radii_sum*radii_sum:
+                            hits[i] = True
+                            break
+                    if hits[i]:
+                        break
+                if hits[i]:
+                    break
+            if hits[i]:
+                break
+
+    return ndistances
+#
+#-----------------------------------------------------------------------
+#
+def first_fit(i, j, accepted):
+    """Sequential part of the batch acceptance. (i, j) are the pairs of
+       candidates in conflict, j < i, sorted by i: candidate i is
+       rejected if any of its j was accepted."""
+
+    for k in range(len(i)):
+        if accepted[i[k]] and accepted[j[k]]:
+            accepted[i[k]] = False
+#
+#-----------------------------------------------------------------------
+#
+def jt_pack(x, y, r, lx, ly, tolerance, reach, outer, decrease, niter_max):
+    """Jodrey-Tory loop of RndPore2D._pack_jt. Grains (x, y, r) are
+       moved in place inside [0,lx]x[0,ly] until the inner scale (the
+       smallest ratio between the distance of two grains, less
+       tolerance, and the sum of their radii) meets the outer scale,
+       which starts at outer and shrinks by 0.5**j*decrease per
+       iteration, j being the order of magnitude of their difference.
+       Grains are kept in cells of side reach, chained in linked lists.
+       Returns the outer and inner scales and the number of iterations
+       (at most niter_max)."""
+
+    ngrains = len(x)
+    ncx = max(1, int(math.ceil(lx/reach)))
+    ncy = max(1, int(math.ceil(ly/reach)))
+    head = [-1]*(ncx*ncy)
+    following = [-1]*ngrains
+    previous = [-1]*ngrains
+    cell = [0]*ngrains
+    version = [0]*ngrains
+    for k in range(ngrains):
+        c = _jt_cell(x[k], reach, ncx)*ncy + _jt_cell(y[k], reach, ncy)
+        cell[k] = c
+        following[k] = head[c]
+        if head[c] >= 0:
+            previous[head[c]] = k
+        head[c] = k
+
+    # Pairs closer than the outer scale, worst first. An entry is
+    # outdated when one of its grains has moved (version changed). As
+    # the outer scale only shrinks, farther pairs are only queued again
+    # when one of their grains moves.
+    heap = [(2., 0, 0, 0, 0)]
+    heap.pop()
+    for k in range(ngrains):
+        _jt_push(k, x, y, r, head, following, version, heap, reach, ncx,
+                 ncy, tolerance, outer, True)
+
+    inner = outer
+    niter = 0
+    while len(heap) > 0 and niter < niter_max:
+
+        inner, a, b, va, vb = heap[0]
+        if va != version[a] or vb != version[b]:
+            heapq.heappop(heap)
+            continue
+        if inner >= outer:
+            break
+        heapq.heappop(heap)
+        niter = niter + 1
+
+        # Pushes the pair apart to the outer scale, the larger grain
+        # moving less. Grains are kept inside the walls at the outer
+        # scale, and the move a wall blocks is made by the other grain.
+        dx = x[a] - x[b]
+        dy = y[a] - y[b]
+        dist = math.sqrt(dx*dx + dy*dy)
+        if dist == 0.:
+            angle = 2.399963229728653*a
+            ux = math.cos(angle)
+            uy = math.sin(angle)
+        else:
+            ux = dx/dist
+            uy = dy/dist
+
+        ra = r[a]
+        rb = r[b]
+        target = outer*(ra + rb) + tolerance
+        share = rb*rb/(ra*ra + rb*rb)
+        ca = outer*ra + tolerance
+        cb = outer*rb + tolerance
+        xa = min(max(x[a] + share*(target - dist)*ux, ca), lx - ca)
+        ya = min(max(y[a] + share*(target - dist)*uy, ca), ly - ca)
+        xb = min(max(xa - target*ux, cb), lx - cb)
+        yb = min(max(ya - target*uy, cb), ly - cb)
+        xa = min(max(xb + target*ux, ca), lx - ca)
+        ya = min(max(yb + target*uy, ca), ly - ca)
+
+        _jt_move(a, xa, ya, x, y, cell, head, following, previous, reach,
+                 ncx, ncy)
+        _jt_move(b, xb, yb, x, y, cell, head, following, previous, reach,
+                 ncx, ncy)
+        version[a] = version[a] + 1
+        version[b] = version[b] + 1
+        _jt_push(a, x, y, r, head, following, version, heap, reach, ncx,
+                 ncy, tolerance, outer, False)
+        _jt_push(b, x, y, r, head, following, version, heap, reach, ncx,
+                 ncy, tolerance, outer, False)
+
+        # Outdated entries are dropped once they fill the queue.
+        if len(heap) > 16*ngrains:
+            valid = [entry for entry in heap if \
+                     entry[3] == version[entry[1]] and \
+                     entry[4] == version[entry[2]]]
+            heap.clear()
+            for entry in valid:
+                heap.append(entry)
+            heapq.heapify(heap)
+
+        # The outer scale shrinks more slowly as the scales converge.
+        level = math.floor(-math.log10(max(outer - inner, 1.e-15)))
+        outer = outer - 0.5**level*decrease
+
+    if len(heap) == 0:
+        inner = outer
+
+    return outer, inner, niter
+#
+#-----------------------------------------------------------------------
+#
+def _jt_cell(x, h, n):
+    """Cell of side h, out of n, containing coordinate x."""
+
+    return min(max(int(math.floor(x/h)), 0), n - 1)
+#
+#-----------------------------------------------------------------------
+#
+def _jt_move(k, xk, yk, x, y, cell, head, following, previous, reach, ncx,
+             ncy):
+    """Moves grain k to (xk, yk), relinking it if it changes cell."""
+
+    x[k] = xk
+    y[k] = yk
+    c = _jt_cell(xk, reach, ncx)*ncy + _jt_cell(yk, reach, ncy)
+    old = cell[k]
+    if c == old:
+        return
+
+    if previous[k] >= 0:
+        following[previous[k]] = following[k]
+    else:
+        head[old] = following[k]
+    if following[k] >= 0:
+        previous[following[k]] = previous[k]
+
+    cell[k] = c
+    previous[k] = -1
+    following[k] = head[c]
+    if head[c] >= 0:
+        previous[head[c]] = k
+    head[c] = k
+#
+#-----------------------------------------------------------------------
+#
+def _jt_push(k, x, y, r, head, following, version, heap, reach, ncx, ncy,
+             tolerance, outer, only_after):
+    """Queues the pairs of grain k with the grains of the neighbour
+       cells closer than the outer scale (only with the grains after k
+       if only_after)."""
+
+    ix = _jt_cell(x[k], reach, ncx)
+    iy = _jt_cell(y[k], reach, ncy)
+    for cx in range(max(ix - 1, 0), min(ix + 2, ncx)):
+        for cy in range(max(iy - 1, 0), min(iy + 2, ncy)):
+            n = head[cx*ncy + cy]
+            while n >= 0:
+                if n != k and (n > k or not only_after):
+                    dx = x[k] - x[n]
+                    dy = y[k] - y[n]
+                    ratio = (math.sqrt(dx*dx + dy*dy) - tolerance)/ \
+                            (r[k] + r[n])
+                    if ratio < outer and k < n:
+                        heapq.heappush(heap, (ratio, k, n, version[k],
+                                              version[n]))
+                    elif ratio < outer:
+                        heapq.heappush(heap, (ratio, n, k, version[n],
+                                              version[k]))
+                n = following[n]
@@ -0,0 +1,301 @@
+"""Termination criteria, cost estimate and counters of the random
+   packings."""
+import time
+import collections
+import numpy as np
+
+class PackingMonitor(object):
+    """Watches a random sequential addition while it runs. It stops the
+       packing when the budget of trials or wall-clock time is spent or
+       when it is effectively jammed, and it estimates the cost of
+       reaching the target.
+
+       The solid fraction gained in the last quarter of the trials (from
+       t/4 to t) is compared with the gain in the quarter before (t/16 to
+       t/4). Their ratio q is assumed to hold for the next quarters, so
+       the packing converges to solid + gain*q/(1 - q) when q < 1. q is
+       at least 3/4: equal discs follow a t^(-1/2) law (q = 1/2) but
+       polydisperse packings approach jamming much more slowly and the
+       early gains fall faster than the late ones. The gain is
+       counted with one grain more, so that the estimate is optimistic.
+       The packing is jammed when it converges below the target, when
+       the target does not fit in the budgets, or when more than
+       ntries_max trials are expected per accepted grain. The budgets
+       are only extrapolated once a sixteenth of them is spent."""
+
+    def __init__(self, target_solid, ntries_max=None, trials_max=None,
+                 time_max=None, jamming=False, margin=1.e-3, start=None):
+        """target_solid is the solid fraction to reach. The packing is
+           jammed if it converges below target_solid - margin. time_max
+           counts from start (time.perf_counter(), now by default)."""
+
+        self.target_solid = target_solid
+        self.ntries_max = ntries_max
+        self.trials_max = trials_max
+        self.time_max = time_max
+        self.jamming = jamming
+        self.margin = margin
+        self.termination = None
+        self.estimate = {'acceptance_rate':None, 'jamming_porosity':None,
+                         'trials_to_target':None, 'seconds_to_target':None}
+
+        self._start = time.perf_counter() if start is None else start
+        self._next_time = 1024
+        self._next_fit = 1024
+        self._trials = [0]
+        self._grains = [None]
+        self._solid = [None]
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def elapsed(self):
+        """Gets seconds since the packing started."""
+
+        return time.perf_counter() - self._start
+#
+#-----------------------------------------------------------------------
+#
+    def update(self, trials, ngrains, solid):
+        """Records the state after trials candidates, with ngrains grains
+           covering the fraction solid. Returns True when the packing has
+           to stop (the reason is in termination)."""
+
+        if self._grains[0] is None:
+            self._trials[0] = trials
+            self._grains[0] = ngrains
+            self._solid[0] = solid
+
+        if self.trials_max is not None and trials >= self.trials_max:
+            self.termination = 'trials_max'
+            return True
+
+        if trials >= self._next_time:
+            self._next_time = trials + 1024
+            if self.time_max is not None and self.elapsed >= self.time_max:
+                self.termination = 'time_max'
+                return True
+
+        # The history is sampled at geometrically spaced trials.
+        if trials >= self._next_fit:
+            self._next_fit = int(1.1*trials) + 1
+            self._trials.append(trials)
+            self._grains.append(ngrains)
+            self._solid.append(solid)
+
+            if self._fit() and self.jamming:
+                self.termination = 'jammed'
+                return True
+
+        return False
+#
+#-----------------------------------------------------------------------
+#
+    def state(self):
+        """Returns the history, schedule and elapsed time as a dict of
+           arrays (see restore)."""
+
+        return {'trials':np.array(self._trials, dtype='int64'),
+                'grains':np.array(self._grains, dtype='int64'),
+                'solid':np.array(self._solid, dtype='float64'),
+                'next':np.array([self._next_time, self._next_fit]),
+                'elapsed':self.elapsed}
+#
+#-----------------------------------------------------------------------
+#
+    def restore(self, state):
+        """Continues from a state. The time budget keeps counting from
+           the elapsed time of the state."""
+
+        self._trials = [int(value) for value in state['trials']]
+        self._grains = [int(value) for value in state['grains']]
+        self._solid = [float(value) for value in state['solid']]
+        self._next_time, self._next_fit = [int(value) for value in
+                                           state['next']]
+        self._start = time.perf_counter() - float(state['elapsed'])
+        if len(self._trials) > 1:
+            self._fit()
+#
+#-----------------------------------------------------------------------
+#
+    def _fit(self):
+        """Updates the estimate. Returns True if the packing is jammed."""
+
+        trials = self._trials[-1]
+        solid = self._solid[-1]
+        ngrains = self._grains[-1]
+
+        # History at t/4 and t/16.
+        k1 = np.searchsorted(self._trials, trials//4, side='right') - 1
+        k2 = np.searchsorted(self._trials, trials//16, side='right') - 1
+        if k2 == k1 or ngrains == 0:
+            return False
+
+        dtrials = float(trials - self._trials[k1])
+        dgrains = ngrains - self._grains[k1]
+        self.estimate['acceptance_rate'] = dgrains/dtrials
+
+        grain_solid = solid/ngrains
+        gain = solid - self._solid[k1] + grain_solid
+        gain_before = self._solid[k1] - self._solid[k2]
+
+        # Too few grains before to tell how the gain decays.
+        if self._grains[k1] - self._grains[k2] < 10:
+            return False
+
+        # Before the asymptotic regime the gain decays faster than it
+        # will later: q is not let below 3/4 (a t^(-0.2) law).
+        q = max(gain/gain_before, 0.75)
+        missing = self.target_solid - solid
+        converged = np.inf
+        if q < 1.:
+            converged = gain*q/(1. - q)
+            self.estimate['jamming_porosity'] = 1. - (solid + converged)
+        else:
+            self.estimate['jamming_porosity'] = None
+
+        # Quarters needed to gain what is missing.
+        if missing <= 0.:
+            nquarters = 0.
+        elif converged <= missing:
+            nquarters = np.inf
+        elif abs(q - 1.) < 1.e-12:
+            nquarters = missing/gain
+        else:
+            nquarters = np.log(1. + missing*(q - 1.)/(gain*q))/np.log(q)
+
+        needed = trials*(4.**nquarters - 1.)
+        seconds = needed*self.elapsed/trials
+        self.estimate['trials_to_target'] = needed
+        self.estimate['seconds_to_target'] = seconds
+
+        if converged < missing - self.margin:
+            return True
+        if self.ntries_max is not None and \
+           dtrials/(dgrains + 1.) > self.ntries_max:
+            return True
+        if self.trials_max is not None and 16*trials >= self.trials_max and \
+           needed > self.trials_max - trials:
+            return True
+        if self.time_max is not None and \
+           16.*self.elapsed >= self.time_max and \
+           seconds > self.time_max - self.elapsed:
+            return True
+
+        return False
+#
+#-----------------------------------------------------------------------
+# END class PackingMonitor
+#-----------------------------------------------------------------------
+#
+
+class PackingStats(object):
+    """Counters of a random packing, to diagnose slow packings and feed
+       dashboards. Set it as the stats of a RndPore2D before the packing
+       is generated. Every interval trials a record (see record) is
+       appended to history and passed to callback, if given. Without
+       stats the packing only pays one test per trial.
+
+       Times are split in sampling (drawing radii and positions),
+       overlap (checks against the packing) and bookkeeping (storing
+       grains, updating the indices and the monitor); setting up the
+       packing is not counted. distances counts
+       the grain distances computed by the overlap checks."""
+
+    def __init__(self, interval=10000, callback=None, window=10):
+        """window is the number of records the acceptance rate is
+           computed over."""
+
+        self.interval = interval
+        self.callback = callback
+        self.window = window
+        self.reset()
+#
+#-----------------------------------------------------------------------
+#
+    def reset(self):
+        """Clears the counters and the history."""
+
+        self.trials = 0
+        self.ngrains = 0
+        self.distances = 0
+        self.porosity = 1.0
+        self.acceptance_rate = None
+        self.termination = None
+        self.time = {'sampling':0., 'overlap':0., 'bookkeeping':0.}
+        self.history = []
+
+        self._start = time.perf_counter()
+        self._lap = self._start
+        self._next = self.interval
+        self._window = collections.deque(maxlen=self.window + 1)
+#
+#-----------------------------------------------------------------------
+#
+    def lap(self, phase=None):
+        """Adds the time since the previous lap to phase (None only
+           starts a new lap)."""
+
+        now = time.perf_counter()
+        if phase is not None:
+            self.time[phase] = self.time[phase] + now - self._lap
+        self._lap = now
+#
+#-----------------------------------------------------------------------
+#
+    def update(self, trials, ngrains, porosity, distances):
+        """Records the state of the packing after trials candidates.
+           A record is taken every interval trials."""
+
+        self.trials = int(trials)
+        self.ngrains = int(ngrains)
+        self.porosity = float(porosity)
+        self.distances = int(distances)
+
+        if trials >= self._next:
+            self._next = trials + self.interval
+            self.sample()
+#
+#-----------------------------------------------------------------------
+#
+    def finish(self, termination):
+        """Takes the last record, with the reason the packing stopped."""
+
+        self.termination = termination
+        self.sample()
+#
+#-----------------------------------------------------------------------
+#
+    def sample(self):
+        """Appends a record to history and passes it to callback."""
+
+        self._window.append((self.trials, self.ngrains))
+        trials, ngrains = self._window[0]
+        if self.trials > trials:
+            self.acceptance_rate = float(self.ngrains - ngrains)/ \
+                                   (self.trials - trials)
+
+        record = self.record()
+        self.history.append(record)
+        if self.callback is not None:
+            self.callback(record)
+#
+#-----------------------------------------------------------------------
+#
+    def record(self):
+        """Returns the counters as a dict."""
+
+        record = {'trials':self.trials, 'ngrains':self.ngrains,
+                  'distances':self.distances, 'porosity':self.porosity,
+                  'acceptance_rate':self.acceptance_rate,
+                  'elapsed':time.perf_counter() - self._start,
+                  'termination':self.termination}
+        for phase in self.time:
+            record['time_' + phase] = self.time[phase]
+
+        return record
+#
+#-----------------------------------------------------------------------
+# END class PackingStats
+#-----------------------------------------------------------------------
+#
@@ -0,0 +1,453 @@
+"""Process-pool helpers for random packings.
+
+   Parallel packing by domain decomposition: the domain is split in
+   vertical strips that are packed concurrently. Grains overlapping across
+   strip boundaries are then removed and the halo bands around the
+   boundaries are refilled in a final serial pass.
+
+   Shared memory: the grains and the cell list of one packing are kept
+   in shared memory and batches of candidates are checked against them
+   by a pool of processes, while the parent accepts the grains.
+
+   Ensembles: independent realisations generated and written in parallel."""
+import numpy as np
+
+# Shared blocks and cell list attached by a worker of SharedOverlap.
+_blocks = {}
+_cells = None
+
+def pack_rnd_tiles(pore, nprocs):
+    """Packs the RndPore2D pore with nprocs processes.
+       Returns the grains (GrainStore) of the packing."""
+
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from PyGrain import GrainStore as grainstore
+
+    start = time.perf_counter()
+    halo = 2.*pore.rmax + pore.tolerance
+    ntiles = tile_count(pore.lx, halo, nprocs)
+    if ntiles < 2:
+        pore._pack_rnd_batch()
+        return pore._grains
+
+    edges = np.linspace(0.0, pore.lx, ntiles + 1)
+    # Independent child streams of the packing stream, one per strip.
+    seeds = pore.rng.bit_generator.seed_seq.spawn(ntiles)
+
+    jobs = []
+    for k in range(ntiles):
+        jobs.append((_tile_settings(pore, edges, k), seeds[k]))
+
+    with ProcessPoolExecutor(max_workers=min(nprocs, ntiles)) as pool:
+        tiles = list(pool.map(_pack_tile, jobs))
+
+    x = np.concatenate([tile[0] + edges[k] for k, tile in enumerate(tiles)])
+    y = np.concatenate([tile[1] for tile in tiles])
+    r = np.concatenate([tile[2] for tile in tiles])
+    owner = np.repeat(np.arange(ntiles), [len(tile[0]) for tile in tiles])
+
+    # With periodic x the first and last strips meet at x = 0 = lx.
+    periodic = pore._periodic_axes()
+    boundaries = edges[1:-1]
+    if periodic[0]:
+        boundaries = edges
+
+    keep = reconcile(x, y, r, owner, boundaries, pore.tolerance, pore.rmax,
+                     pore.lx, pore.ly, periodic)
+
+    grains = grainstore(max(pore.ngrains_max, 1))
+    grains.append(x[keep], y[keep], pore.zeta, r[keep])
+
+    bands = [[max(0.0, edge - halo), min(pore.lx, edge + halo)] \
+             for edge in boundaries]
+    pore._pack_rnd_batch(grains, region=bands, start=start)
+    pore._trials = pore._trials + sum(tile[3] for tile in tiles)
+
+    return pore._grains
+#
+#-----------------------------------------------------------------------
+#
+def run_ensemble(params, count, seed, nprocs=1, fname=None, meshtype='gmsh',
+                 return_circles=False):
+    """Generates count RndPore2D realisations in a pool of nprocs
+       processes. params is a dict of RndPore2D arguments and
+       properties (e.g. ngrains_max, size). Realisation i gets its own
+       seed, the i-th child of np.random.SeedSequence(seed), so every
+       realisation can be regenerated alone. If fname is given (e.g.
+       'rnd-{:04d}.geo'), fname.format(i) is written with write_mesh.
+       Returns one dict per realisation with index, seed, porosity,
+       ngrains, trials, time and fname. The circles are only sent back
+       if return_circles is True."""
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    children = np.random.SeedSequence(seed).spawn(count)
+    jobs = []
+    for i, child in enumerate(children):
+        name = None if fname is None else fname.format(i)
+        jobs.append((params, i, int(child.generate_state(1, np.uint64)[0]),
+                     name, meshtype, return_circles))
+
+    if nprocs == 1:
+        return [_pack_realisation(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=nprocs) as pool:
+        return list(pool.map(_pack_realisation, jobs))
+#
+#-----------------------------------------------------------------------
+#
+def tile_count(lx, halo, nprocs):
+    """Number of strips: one per process, but no narrower than
+       two halos so that only neighbouring strips interact."""
+
+    return max(1, min(nprocs, int(lx//(2.*halo))))
+#
+#-----------------------------------------------------------------------
+#
+def reconcile(x, y, r, owner, boundaries, tolerance, rmax, lx, ly,
+              periodic=(False, False)):
+    """Returns a mask of the grains kept. For every pair of grains of
+       different strips closer than tolerance, the grain of the strip
+       with the highest index is removed. The result only depends on
+       the grains, not on the order in which strips were finished.
+       Distances along periodic directions use the nearest image."""
+
+    from PyCellList import CellList as celllist
+
+    keep = np.ones(len(x), dtype=bool)
+    if len(boundaries) == 0 or len(x) == 0:
+        return keep
+
+    reach = 2.*rmax + tolerance
+    boundaries = np.asarray(boundaries)
+    if len(boundaries) == 1:
+        near = np.abs(x - boundaries[0]) <= reach
+    else:
+        # Boundaries on both sides of every grain (the first or the
+        # last two beyond the ends).
+        right = np.searchsorted(boundaries, x).clip(1, len(boundaries) - 1)
+        near = (np.abs(x - boundaries[right - 1]) <= reach) | \
+               (np.abs(x - boundaries[right]) <= reach)
+    inear = np.flatnonzero(near)
+
+    cells = celllist(lx, ly, reach, periodic=periodic)
+    cells.insert_many(np.arange(len(inear)), x[inear], y[inear])
+
+    i, j = cells.pairs(x[inear], y[inear], reach)
+    i = inear[i]
+    j = inear[j]
+    dist = np.hypot(*cells.minimum_image(x[i] - x[j], y[i] - y[j]))
+    hit = (owner[i] != owner[j]) & (dist <= r[i] + r[j] + tolerance)
+
+    loser = np.where(owner[i] > owner[j], i, j)[hit]
+    keep[loser] = False
+
+    return keep
+#
+#-----------------------------------------------------------------------
+#
+def _tile_settings(pore, edges, k):
+    """Settings of the RndPore2D packing strip k. Sides shared with
+       other strips are open: grains can cross them."""
+
+    left, right, bottom, top = pore._walls
+    width = edges[k + 1] - edges[k]
+    ntiles = len(edges) - 1
+    # Cumulative rounding, so the strips add up to ngrains_max.
+    quota = np.round(pore.ngrains_max*np.asarray(edges)/pore.lx)
+
+    return {'lx':width, 'ly':pore.ly, 'rmin':pore.rmin, 'rmax':pore.rmax,
+            'target_porosity':pore.target_porosity,
+            'ntries_max':pore.ntries_max,
+            'ngrains_max':int(quota[k + 1] - quota[k]),
+            'batch_size':pore.batch_size, 'sampling':pore.sampling,
+            'tolerance':pore.tolerance, 'isPeriodic':pore.isPeriodic,
+            'distribution':pore.distribution, 'time_max':pore.time_max,
+            'trials_max':_share(pore.trials_max, width/pore.lx),
+            'jamming':pore.jamming,
+            'walls':(left and k == 0, right and k == ntiles - 1,
+                     bottom, top)}
+#
+#-----------------------------------------------------------------------
+#
+def _share(budget, fraction):
+    """Part of a budget (None is no limit) given to one strip."""
+
+    if budget is None:
+        return None
+
+    return max(1, int(budget*fraction))
+#
+#-----------------------------------------------------------------------
+#
+def _pack_tile(job):
+    """Worker: packs one strip. Returns x (relative to the strip),
+       y and radii of its grains and the number of candidates drawn."""
+
+    from RecPore2D import RndPore2D as rndp
+
+    settings, seed = job
+    if settings['ngrains_max'] == 0:
+        return np.empty(0), np.empty(0), np.empty(0), 0
+
+    tile = rndp(lx=settings['lx'], ly=settings['ly'],
+                rmin=settings['rmin'], rmax=settings['rmax'],
+                target_porosity=settings['target_porosity'], packing='rnd')
+    tile.ntries_max = settings['ntries_max']
+    tile.ngrains_max = settings['ngrains_max']
+    tile.batch_size = settings['batch_size']
+    tile.sampling = settings['sampling']
+    tile.tolerance = settings['tolerance']
+    tile.isPeriodic = settings['isPeriodic']
+    tile.distribution = settings['distribution']
+    tile.time_max = settings['time_max']
+    tile.trials_max = settings['trials_max']
+    tile.jamming = settings['jamming']
+    tile._walls = settings['walls']
+    tile.rng = np.random.default_rng(seed)
+
+    tile._pack_rnd()
+    grains = tile._grains
+
+    return grains.x.copy(), grains.y.copy(), grains.radius.copy(), \
+           tile.trials
+#
+#-----------------------------------------------------------------------
+#
+def _pack_realisation(job):
+    """Worker: generates (and writes) one realisation of an ensemble.
+       Returns its summary."""
+
+    import time
+    from RecPore2D import RndPore2D as rndp
+
+    params, index, seed, fname, meshtype, return_circles = job
+    arguments = ['lx', 'ly', 'rmin', 'rmax', 'target_porosity', 'packing']
+
+    start = time.perf_counter()
+
+    pore = rndp(seed=seed, **dict((key, params[key]) for key in arguments \
+                                  if key in params))
+    for key in params:
+        if key not in arguments:
+            setattr(pore, key, params[key])
+
+    circles = pore.circles
+    grains = pore._grains
+    if fname is not None:
+        pore.write_mesh(fname=fname, meshtype=meshtype)
+
+    summary = {'index':index, 'seed':seed,
+               'porosity':1.0 - float(np.sum(grains.area))/(pore.lx*pore.ly),
+               'ngrains':int(pore.ngrains), 'trials':pore.trials,
+               'time':time.perf_counter() - start, 'fname':fname}
+    if return_circles:
+        from numpy.lib.recfunctions import repack_fields
+        summary['circles'] = repack_fields(circles)
+
+    return summary
+#
+#-----------------------------------------------------------------------
+#
+class SharedOverlap(object):
+    """Checks batches of candidates against a packing with nprocs
+       processes: the parent and a pool of nprocs - 1 workers. The
+       grains (GrainStore) and the cell list (CellList) of the packing
+       live in shared memory, so new grains are written once by the
+       parent and read in place by the workers; the candidates and the
+       results are exchanged through shared memory too. Only the names
+       of the blocks and a few numbers are sent with every batch. The
+       results are those of CellList.overlap_batch."""
+
+    def __init__(self, nprocs):
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.nprocs = nprocs
+        self.pool = ProcessPoolExecutor(max_workers=max(1, nprocs - 1))
+        self.cells = None
+        self.grains = None
+        self._blocks = {}
+#
+#-----------------------------------------------------------------------
+#
+    def attach(self, cells, grains):
+        """Moves the arrays of cells (CellList) and grains (GrainStore)
+           to shared memory. Returns the function checking candidates,
+           with the arguments of cells.overlap_batch."""
+
+        self.cells = cells
+        self.grains = grains
+        self._publish()
+
+        return self.overlap_batch
+#
+#-----------------------------------------------------------------------
+#
+    def overlap_batch(self, x, y, r, xx, yy, rr, tolerance, reach):
+        """Checks which of the discs (x, y, r) overlap any of the grains
+           of the packing. xx, yy and rr are those grains, as for
+           CellList.overlap_batch."""
+
+        cells = self.cells
+        ncandidates = len(x)
+        if len(xx) == 0 or ncandidates == 0:
+            return np.zeros(ncandidates, dtype=bool)
+
+        self._publish(ncandidates)
+        candidates = self._blocks['candidates'][1]
+        candidates[0, :ncandidates] = x
+        candidates[1, :ncandidates] = y
+        candidates[2, :ncandidates] = r
+
+        # Chunk 0 is checked by the parent while the workers run.
+        bounds = np.linspace(0, ncandidates, self.nprocs + 1).astype(int)
+        specs = self._specs()
+        geometry = (cells.lx, cells.ly, cells.cell_size, cells.periodic)
+        futures = [self.pool.submit(_overlap_shared, specs, geometry,
+                                    len(xx), bounds[k], bounds[k + 1],
+                                    tolerance, reach) \
+                   for k in range(1, self.nprocs) if bounds[k] < bounds[k + 1]]
+
+        hits = self._blocks['hits'][1]
+        first = bounds[1]
+        hits[:first] = cells.overlap_batch(x[:first], y[:first], r[:first],
+                                           xx, yy, rr, tolerance, reach)
+        for future in futures:
+            cells.ndistances = cells.ndistances + future.result()
+
+        return hits[:ncandidates].copy()
+#
+#-----------------------------------------------------------------------
+#
+    def close(self):
+        """Stops the workers and moves the arrays of the packing back to
+           private memory. Views of them taken before are invalid."""
+
+        self.pool.shutdown()
+        if self.grains is not None:
+            self.grains._columns = self.grains._columns.copy()
+            self.cells.cells = self.cells.cells.copy()
+            self.cells.count = self.cells.count.copy()
+
+        for key in list(self._blocks):
+            self._release(key)
+#
+#-----------------------------------------------------------------------
+#
+    def _publish(self, ncandidates=0):
+        """Makes sure the arrays of the packing are in shared memory.
+           Arrays reallocated (grown) since the last call are copied to
+           new blocks. The candidate blocks hold at least ncandidates."""
+
+        self.grains._columns = self._share('grains', self.grains._columns)
+        self.cells.cells = self._share('cells', self.cells.cells)
+        self.cells.count = self._share('count', self.cells.count)
+
+        if 'hits' not in self._blocks or \
+           len(self._blocks['hits'][1]) < ncandidates:
+            size = max(ncandidates, 1024)
+            self._share('candidates', np.empty((3, size)))
+            self._share('hits', np.empty(size, dtype=bool))
+#
+#-----------------------------------------------------------------------
+#
+    def _share(self, key, array):
+        """Returns a copy of array in the shared block key, or array if
+           it already lives there. The old block of key is released."""
+
+        from multiprocessing import shared_memory
+
+        if key in self._blocks and self._blocks[key][1] is array:
+            return array
+
+        block = shared_memory.SharedMemory(create=True,
+                                           size=max(array.nbytes, 1))
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        view[...] = array
+
+        if key in self._blocks:
+            self._release(key)
+        self._blocks[key] = (block, view)
+
+        return view
+#
+#-----------------------------------------------------------------------
+#
+    def _release(self, key):
+        """Frees the shared block key. Workers still attached keep it
+           alive until they move to the new one."""
+
+        block, view = self._blocks.pop(key)
+        del view
+        block.close()
+        block.unlink()
+#
+#-----------------------------------------------------------------------
+#
+    def _specs(self):
+        """Returns the names, shapes and types of the shared blocks."""
+
+        return tuple((key, block.name, view.shape, view.dtype) \
+                     for key, (block, view) in sorted(self._blocks.items()))
+#
+#-----------------------------------------------------------------------
+# END class SharedOverlap
+#-----------------------------------------------------------------------
+#
+def _overlap_shared(specs, geometry, ngrains, first, last, tolerance, reach):
+    """Worker of SharedOverlap: checks candidates first to last against
+       the first ngrains grains. Returns the number of distances
+       computed."""
+
+    global _cells
+    from PyCellList import CellList as celllist
+
+    lx, ly, cell_size, periodic = geometry
+    if _cells is None or \
+       (_cells.lx, _cells.ly, _cells.cell_size, _cells.periodic) != geometry:
+        _cells = celllist(lx, ly, cell_size, capacity=1, periodic=periodic)
+
+    # The views of old blocks are dropped before they are closed.
+    _cells.cells = None
+    _cells.count = None
+    blocks = _attach(specs)
+
+    _cells.cells = blocks['cells']
+    _cells.count = blocks['count']
+    _cells.ndistances = 0
+
+    xx, yy, zz, rr = blocks['grains'][:4, :ngrains]
+    x, y, r = blocks['candidates'][:, first:last]
+    blocks['hits'][first:last] = _cells.overlap_batch(
+        x, y, r, xx, yy, rr, tolerance, reach)
+
+    return _cells.ndistances
+#
+#-----------------------------------------------------------------------
+#
+def _attach(specs):
+    """Worker of SharedOverlap: attaches to the shared blocks of specs,
+       detaching from the blocks they replace. Returns their arrays by
+       key. Workers share the resource tracker of the parent, which
+       unlinks the blocks."""
+
+    from multiprocessing import shared_memory
+
+    names = set(spec[1] for spec in specs)
+    for name in list(_blocks):
+        if name not in names:
+            block, view = _blocks.pop(name)
+            del view
+            block.close()
+
+    arrays = {}
+    for key, name, shape, dtype in specs:
+        if name not in _blocks:
+            block = shared_memory.SharedMemory(name=name)
+            _blocks[name] = (block, np.ndarray(shape, dtype=dtype,
+                                               buffer=block.buf))
+        arrays[key] = _blocks[name][1]
+
+    return arrays
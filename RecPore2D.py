@@ -1,5 +1,7 @@
 """2D rectangular porous medium generation"""
 
+import numbers
+import time
 import warnings
 import numpy as np
 import PoreError as PoreError
@@ -21,10 +23,13 @@ class RecPore2D(object):
         self._lx = None
         self._ly = None
         self._size = None
+        self._transfinite = None
         self._is3D = False
         self._zeta = 0.5
         self._packing_done = False
         self._circles_done = False
+        self._seed = None
+        self._rng = None
 
 #
 #-----------------------------------------------------------------------
@@ -70,15 +75,17 @@ class RecPore2D(object):
     @bounding_box.setter
     def bounding_box(self, value):
         """Sets the mesh bounding box.
-           The bounding box is only used when writting SnappyHexMesh meshes."""
+           The bounding box is only used when writting SnappyHexMesh meshes.
+           A box with None corners is the default one, which follows the
+           grains every time the packing is generated."""
 
         pmin, pmax = value
-        if (pmax is None) | (pmin is None):
+        self._bbox_set = not ((pmax is None) | (pmin is None))
+        if not self._bbox_set:
             [pmin, pmax] = self._get_BoundingBox()
 
         self._bbox_pmin = pmin
         self._bbox_pmax = pmax
-        self._bbox_set = True
         self._packing_done = False
 #
 #-----------------------------------------------------------------------
@@ -185,6 +192,27 @@ class RecPore2D(object):
             raise PoreError.ErrorSize
 #
 #-----------------------------------------------------------------------
+#
+    @property
+    def transfinite(self):
+        """Gets nodes per arc of the discs in the gmsh mesh."""
+
+        return self._transfinite
+#
+#-----------------------------------------------------------------------
+#
+    @transfinite.setter
+    def transfinite(self, value):
+        """Sets nodes per arc (a quarter of disc) in the gmsh mesh.
+           None (the default) gives 20 nodes to every arc. (nmin, nmax)
+           sets them from the radius so that segments are about size
+           long, with at least nmin and at most nmax nodes."""
+        if self._check_transfinite(value):
+            self._transfinite = None if value is None else tuple(value)
+        else:
+            raise PoreError.ErrorTransfinite
+#
+#-----------------------------------------------------------------------
 #
     @property
     def zeta(self):
@@ -228,6 +256,7 @@ class RecPore2D(object):
         else:
            warnings.warn("Value must be True/False.")
            self._is3D = False
+        self._packing_done = False
 #
 #-----------------------------------------------------------------------
 #
@@ -251,6 +280,67 @@ class RecPore2D(object):
 
 #
 #-----------------------------------------------------------------------
+#
+    @property
+    def seed(self):
+        """Gets the seed of the random streams."""
+
+        return self._seed
+#
+#-----------------------------------------------------------------------
+#
+    @seed.setter
+    def seed(self, value):
+        """Sets the seed of the random streams. The same seed gives
+           the same packing and exported files. With None every
+           packing is different. It replaces a generator set with rng."""
+
+        if self._check_seed(value):
+            self._seed = value
+            self._rng = None
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorSeed
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def rng(self):
+        """Gets the random generator (np.random.Generator) of
+           the packing."""
+
+        if self._rng is None:
+            self._rng = self._new_rng(0)
+        return self._rng
+#
+#-----------------------------------------------------------------------
+#
+    @rng.setter
+    def rng(self, value):
+        """Sets the random generator (np.random.Generator) of
+           the packing. It is used as given, i.e. its stream is not
+           restarted when the packing is generated again. It replaces
+           the seed, which is set to None: the last one set wins."""
+
+        if self._check_rng(value):
+            self._rng = value
+            self._seed = None
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorRng
+#
+#-----------------------------------------------------------------------
+#
+    def _new_rng(self, stream):
+        """Returns a new generator for stream (0 for the packing,
+           1 for the exporters). The streams are the children of
+           np.random.SeedSequence(seed), so they are independent."""
+
+        sequence = np.random.SeedSequence(self._seed, spawn_key=(stream,))
+
+        return np.random.default_rng(sequence)
+#
+#-----------------------------------------------------------------------
 #
     def _generate_packing(self):
         """Defined in children"""
@@ -281,6 +371,24 @@ class RecPore2D(object):
         return nblocks_x*nblocks_y*nblocks_z > 1
 #
 #-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _check_seed(seed):
+        """ Checks the seed.
+            It has to be None or a non-negative integer."""
+        return seed is None or \
+               (isinstance(seed, (int, np.integer)) and \
+                not isinstance(seed, bool) and seed >= 0)
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _check_rng(rng):
+        """ Checks the random generator.
+            It has to be a np.random.Generator."""
+        return isinstance(rng, np.random.Generator)
+#
+#-----------------------------------------------------------------------
 #
     @staticmethod
     def _check_size(size):
@@ -289,6 +397,22 @@ class RecPore2D(object):
         return size > 1.e-9
 #
 #-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _check_transfinite(transfinite):
+        """ Checks the nodes per arc. It is None or a pair of
+            integers 2 <= nmin <= nmax."""
+        if transfinite is None:
+            return True
+        try:
+            nmin, nmax = transfinite
+        except (TypeError, ValueError):
+            return False
+        return all(isinstance(n, numbers.Integral) and \
+                   not isinstance(n, bool) for n in (nmin, nmax)) and \
+               2 <= nmin <= nmax
+#
+#-----------------------------------------------------------------------
 #
     # pylint: disable=W0613
     @staticmethod
@@ -398,6 +522,8 @@ class RecPore2D(object):
     def write_mesh(self, fname='', meshtype='gmsh'):
         """ Writes the porus media for the mesh/cad program"""
         meshes = {'gmsh':self._writeGMSH, 'oscad':self._writeOPENSCAD, \
+                  'gmsh_compact':self._writeGMSHCompact, \
+                  'gmsh_occ':self._writeGMSHOCC, \
                   'snappy':self._writeSNAPPYHEXMESH, \
                   'stl': self._writeSTL, 'img':self._writeIMG}
 
@@ -411,17 +537,35 @@ class RecPore2D(object):
     def _get_BoundingBox(self):
         """Defined  by children."""
         pass
+#
+#-----------------------------------------------------------------------
+#
+    def _update_BoundingBox(self):
+        """Sets the default bounding box of the grains, unless the user
+           set one."""
+
+        if not self._bbox_set:
+            self._bbox_pmin, self._bbox_pmax = self._get_BoundingBox()
+#
+#-----------------------------------------------------------------------
+#
+    def _mesh_circles(self):
+        """Returns the circles written by the exporters."""
+
+        return self._circles
 
 
 #
 #-----------------------------------------------------------------------
 #
-    def _writeGMSH(self, fname):
-        """Writes the discs packing for gmsh"""
+    def _writeGMSH(self, fname, compact=False):
+        """Writes the discs packing for gmsh. If compact is True the
+           discs are written as a table that gmsh loops over."""
 
         import PyGmsh as gmsh
 
         mesh = gmsh.PyGmsh()
+        mesh.transfinite = self.transfinite
 
         [pmin, pmax] = self.bounding_box
 
@@ -429,12 +573,46 @@ class RecPore2D(object):
 
         mesh.add_BoundingBox(pmin[0] +  self.xoffset, pmax[0] + self.xoffset, pmin[1], pmax[1], pmin[2], size)
 
+        # The built-in kernel cannot cut the discs with the box. The
+        # default box only cuts them along periodic sides.
+        circles = self._mesh_circles()
+        if np.any((circles['x'] - circles['r'] < pmin[0]) |
+                  (circles['x'] + circles['r'] > pmax[0]) |
+                  (circles['y'] - circles['r'] < pmin[1]) |
+                  (circles['y'] + circles['r'] > pmax[1])):
+            raise PoreError.ErrorGmshBox
+        centers = np.column_stack((circles['x'] + self.xoffset,
+                                   circles['y'], circles['z']))
+        mesh.add_circles(centers, circles['r'], size, compact=compact)
 
-        for circ in self._circles:
+        mesh.write_code(fname)
+#
+#-----------------------------------------------------------------------
+#
+    def _writeGMSHCompact(self, fname):
+        """Writes the discs packing for gmsh as a table of discs"""
 
-            center = (circ['x'] + self.xoffset, circ['y'], circ['z'])
-            r = circ['r']
-            mesh.add_circle(center, r, size)
+        self._writeGMSH(fname, compact=True)
+#
+#-----------------------------------------------------------------------
+#
+    def _writeGMSHOCC(self, fname):
+        """Writes the discs (spheres if is3D) packing for the
+           OpenCASCADE kernel of gmsh"""
+
+        import PyGmsh as gmsh
+
+        mesh = gmsh.PyGmshOCC(is3D=self.is3D)
+
+        [pmin, pmax] = self.bounding_box
+        xoffset = np.array([self.xoffset, 0., 0.])
+        mesh.add_BoundingBox(np.array(pmin) + xoffset,
+                             np.array(pmax) + xoffset, self.size)
+
+        circles = self._mesh_circles()
+        centers = np.column_stack((circles['x'] + self.xoffset,
+                                   circles['y'], circles['z']))
+        mesh.add_circles(centers, circles['r'])
 
         mesh.write_code(fname)
 #
@@ -459,7 +637,7 @@ class RecPore2D(object):
             mesh.apply_translation(translation=trans)
 
         ii = 0
-        for circ in self._circles:
+        for circ in self._mesh_circles():
             ii = ii + 1
             r = circ['r']
             center = (circ['x'] + self.xoffset, circ['y'], circ['z'])
@@ -493,7 +671,7 @@ class RecPore2D(object):
         mesh = oscad.PyOpenSCAD()
 
 
-        for circ in self._circles:
+        for circ in self._mesh_circles():
 
             center = (circ['x'] + self.xoffset, circ['y'], circ['z'])
             r = circ['r']
@@ -517,7 +695,8 @@ class RecPore2D(object):
 
         mesh.is3D = self.is3D
 
-        for circ in self._circles:
+        circles = self._mesh_circles()
+        for circ in circles:
 
             center = (circ['x'] + self.xoffset, circ['y'], circ['z'])
             r = circ['r']
@@ -537,16 +716,20 @@ class RecPore2D(object):
         # Gets a point inside the mesh
         point_inside_circle = True
         p1z = self._zeta
+        rng = self._new_rng(1)
 
         while point_inside_circle:
 
-            p1x =  np.random.uniform(pmin[0], pmax[0])
-            p1y =  np.random.uniform(pmin[1], pmax[1])
+            p1x =  rng.uniform(pmin[0], pmax[0])
+            p1y =  rng.uniform(pmin[1], pmax[1])
+            if self._packs_spheres():
+                p1z = rng.uniform(pmin[2], pmax[2])
             point_inside_circle = False
 
-            for circ in self._circles:
+            for circ in circles:
                 center = (circ['x'] + self.xoffset, circ['y'], circ['z'])
-                d = np.sqrt((center[0]-p1x)**2. + (center[1]-p1y)**2.)
+                d = np.sqrt((center[0]-p1x)**2. + (center[1]-p1y)**2. +
+                            self._packs_spheres()*(center[2]-p1z)**2.)
                 if d<circ['r']:
                     point_inside_circle = True
                     break
@@ -573,6 +756,14 @@ class RecPore2D(object):
 
 #
 #-----------------------------------------------------------------------
+#
+    def _packs_spheres(self):
+        """Checks if the grains are spheres placed in 3D. Otherwise they
+           are discs, all at z = zeta."""
+
+        return False
+#
+#-----------------------------------------------------------------------
 # END class RecPore2D
 #-----------------------------------------------------------------------
 #
@@ -816,8 +1007,7 @@ class RegPore2D(RecPore2D):
         elif self.packing == 'etri':
             self.circles, self._circles_done = self._pack_etri()
 
-        if None in self.bounding_box:
-            self.bounding_box = self._get_BoundingBox()
+        self._update_BoundingBox()
 
         #print 'max'
         #print np.max(self.circles[:]['x'])*0.02
@@ -981,21 +1171,68 @@ class RegPore2D(RecPore2D):
 
 class RndPore2D(RecPore2D):
     """Random porous medium."""
+
+    # Parameters saved in checkpoints, the arguments of __init__ first.
+    _checkpoint_params = ['lx', 'ly', 'rmin', 'rmax', 'target_porosity',
+                          'seed', 'ntries_max', 'ngrains_max', 'batch_size',
+                          'sampling', 'tolerance', 'isPeriodic',
+                          'isPeriodicX', 'time_max', 'trials_max',
+                          'jamming', 'checkpoint_interval', 'schedule',
+                          'nprocs', 'parallel', 'is3D', 'lz']
 #
 #-----------------------------------------------------------------------
 #
-    def __init__(self, lx=1., ly=1., rmin=0.01, rmax=0.2, target_porosity=0.5, packing='rnd'):
-        """Checks arguments and creates random packing of discs."""
+    def __init__(self, lx=1., ly=1., rmin=0.01, rmax=0.2, target_porosity=0.5, packing='rnd', seed=None, distribution=None):
+        """Checks arguments and creates random packing of discs.
+           Packings with the same seed (and parameters) are equal.
+           distribution (PyDistribution) defaults to uniform radii."""
 
         super(RndPore2D, self).__init__()
 
-        self._packs = ['rnd'] #TO DO Jodry-Tory, etc.
+        self._packs = ['rnd', 'ls', 'jt']
         self._rmin = None
         self._rmax = None
         self._target_porosity = None
         self._packing = None
         self._ntries_max = None
         self._ngrains_max = None
+        self._batch_size = 1
+        self._nprocs = 1
+        self._parallels = ['tiles', 'shared']
+        self._parallel = 'tiles'
+        self._samplings = ['uniform', 'void']
+        self._sampling = 'uniform'
+        self._schedules = ['random', 'largest_first']
+        self._schedule = 'random'
+        self._unplaced = np.empty(0)
+        self._time_max = None
+        self._trials_max = None
+        self._jamming = False
+        self._termination = None
+        self._estimate = None
+        self._porosity = None
+        self._stats = None
+        self._checkpoint = None
+        self._checkpoint_interval = 5.
+        self._resume_state = None
+        self._incremental = False
+        # Settings of the last 'rnd' packing that a continuation keeps.
+        self._packed = None
+        self._goal = None
+        self._grains = None
+        self._trials = None
+        self._isPeriodicX = False
+        self._lz = None
+        self._distribution = None
+        # Sides (left, right, bottom, top) that grains cannot cross.
+        self._walls = (True, True, True, True)
+        self._ls_max_iters = 5000
+        self._ls_overlap = 1.e-3
+        self._ls_final_overlap = 1.e-7
+        self._ls_bisections = 12
+        self._jt_delta = 1.e-4
+        # Largest batch of positions tried for one radius (largest_first).
+        self._sorted_batch_max = 4096
         self._tolerance = rmin/10.
 
         self.lx = lx
@@ -1006,7 +1243,8 @@ class RndPore2D(RecPore2D):
         self.packing = packing
         self.ntries_max = int(1e7)
         self.ngrains_max = 1000
-        #self.distribution = TO DO
+        self.seed = seed
+        self.distribution = distribution
 #
 #-----------------------------------------------------------------------
 #
@@ -1105,6 +1343,497 @@ class RndPore2D(RecPore2D):
             raise PoreError.ErrorNgrainsMax
 #
 #-----------------------------------------------------------------------
+#
+    @property
+    def batch_size(self):
+        """ Returns number of candidate grains drawn at once."""
+        return self._batch_size
+#
+#-----------------------------------------------------------------------
+#
+    @batch_size.setter
+    def batch_size(self, value):
+        """ Sets number of candidate grains drawn at once.
+            With batch_size > 1 candidates are generated and checked
+            as arrays. The result is the same as adding them one by one
+            in the order they were drawn."""
+        if self._check_batch_size(value):
+            self._batch_size = value
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorBatchSize
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def distribution(self):
+        """ Returns the radius distribution."""
+        return self._distribution
+#
+#-----------------------------------------------------------------------
+#
+    @distribution.setter
+    def distribution(self, value):
+        """ Sets the radius distribution (see PyDistribution), truncated
+            to [rmin, rmax]. None means uniform radii."""
+        if self._check_distribution(value):
+            self._distribution = value
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorDistribution
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def isPeriodicX(self):
+        """Gets periodicity in X status."""
+
+        return self._isPeriodicX
+#
+#-----------------------------------------------------------------------
+#
+    @isPeriodicX.setter
+    def isPeriodicX(self, value):
+        """set periodicity in x. Together with isPeriodic (periodicity
+           in y) it makes the 'rnd' packing periodic: grains wrap across
+           the periodic sides, overlaps are checked with the nearest
+           image and the bounding box is the domain itself."""
+
+        if type(value) == bool:
+            self._isPeriodicX = value
+            self._packing_done = False
+        else:
+           warnings.warn("isPeriodicX must be True/False.")
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def lz(self):
+        """Gets depth of the 3D random packing."""
+
+        return self._lz
+#
+#-----------------------------------------------------------------------
+#
+    @lz.setter
+    def lz(self, value):
+        """ Sets the depth. With is3D and a depth, the 'rnd' packing is
+            a packing of spheres in [0,lx]x[0,ly]x[0,lz] and porosity
+            is a volume fraction (see _pack_rnd_3D). None (the default)
+            keeps the discs of the 2D packing at z = zeta."""
+        if self._check_lz(value):
+            self._lz = value
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorLz
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def trials(self):
+        """ Returns number of candidate grains drawn by the last
+            random packing (None for 'ls' and 'jt')."""
+        return self._trials
+#
+#-----------------------------------------------------------------------
+#
+    @classmethod
+    def ensemble(cls, params, count, seed, nprocs=1, fname=None,
+                 meshtype='gmsh', return_circles=False):
+        """ Generates count realisations of a random packing with
+            nprocs processes (see PyParallel.run_ensemble) and returns
+            a summary of each of them."""
+
+        from PyParallel import run_ensemble
+
+        return run_ensemble(params, count, seed, nprocs=nprocs,
+                            fname=fname, meshtype=meshtype,
+                            return_circles=return_circles)
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def nprocs(self):
+        """ Returns number of processes used by the random packing."""
+        return self._nprocs
+#
+#-----------------------------------------------------------------------
+#
+    @nprocs.setter
+    def nprocs(self, value):
+        """ Sets number of processes used by the random packing.
+            With nprocs > 1 the 'rnd' packing runs in parallel as set
+            by parallel."""
+        if self._check_nprocs(value):
+            self._nprocs = value
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorNprocs
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def parallel(self):
+        """ Returns how the 'rnd' packing uses nprocs > 1 processes."""
+        return self._parallel
+#
+#-----------------------------------------------------------------------
+#
+    @parallel.setter
+    def parallel(self, value):
+        """ Sets how the 'rnd' packing uses nprocs > 1 processes:
+            tiles  -- the domain is split in strips packed in parallel
+                      (see PyParallel.pack_rnd_tiles)
+            shared -- batches of batch_size candidates are checked by
+                      all processes against the packing, kept in shared
+                      memory (see PyParallel.SharedOverlap). The packing
+                      is the one of a single process."""
+        if value in self._parallels:
+            self._parallel = value
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorParallel
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def sampling(self):
+        """ Returns how the centers of new grains are drawn."""
+        return self._sampling
+#
+#-----------------------------------------------------------------------
+#
+    @sampling.setter
+    def sampling(self, value):
+        """ Sets how the centers of new grains are drawn:
+            uniform -- uniform in the whole domain
+            void  -- uniform in the cells where a grain of radius rmin
+                     still fits. Cells are retired as they fill, so the
+                     acceptance rate does not collapse near saturation."""
+        if value in self._samplings:
+            self._sampling = value
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorSampling
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def time_max(self):
+        """ Returns the wall-clock budget (seconds) of the random packing."""
+        return self._time_max
+#
+#-----------------------------------------------------------------------
+#
+    @time_max.setter
+    def time_max(self, value):
+        """ Sets the wall-clock budget (seconds) of the random packing.
+            None means no limit."""
+        if self._check_budget(value):
+            self._time_max = value
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorBudget
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def trials_max(self):
+        """ Returns the budget of candidate grains of the random packing."""
+        return self._trials_max
+#
+#-----------------------------------------------------------------------
+#
+    @trials_max.setter
+    def trials_max(self, value):
+        """ Sets the total number of candidate grains the random packing
+            may draw (ntries_max only limits consecutive failures).
+            None means no limit."""
+        if self._check_budget(value):
+            self._trials_max = value
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorBudget
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def jamming(self):
+        """ Returns if the random packing stops when it is jammed."""
+        return self._jamming
+#
+#-----------------------------------------------------------------------
+#
+    @jamming.setter
+    def jamming(self, value):
+        """ Sets if the random packing stops as soon as it is effectively
+            jammed: it is predicted to converge above the target porosity,
+            the target cannot be reached within the budgets or more than
+            ntries_max trials are expected per grain (see PyMonitor).
+            False by default: the estimate is rough early in a packing."""
+        if type(value) == bool:
+            self._jamming = value
+            self._packing_done = False
+        else:
+           warnings.warn("jamming must be True/False.")
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def incremental(self):
+        """ Returns if changed random packings are continued."""
+        return self._incremental
+#
+#-----------------------------------------------------------------------
+#
+    @incremental.setter
+    def incremental(self, value):
+        """ Sets if a 'rnd' packing asked for more grains is continued
+            from its grains instead of generated again (circles is then
+            updated as soon as a setting changes). It is continued when
+            target_porosity, ngrains_max or ntries_max changed, the
+            packing can still reach them (it stopped neither jammed nor
+            after ntries_max) and the other settings kept by
+            _packing_settings are the same. Changes that do not affect
+            the packing (e.g. size) keep it as it is. The continuation
+            keeps drawing from the random stream. The largest_first and
+            multi-process packings are always generated again."""
+        if type(value) == bool:
+            self._incremental = value
+        else:
+           warnings.warn("incremental must be True/False.")
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def circles(self):
+        """Gets circles. In incremental mode a changed packing is
+           continued (or generated again) first."""
+
+        if not self._circles_done or \
+           (self.incremental and not self._packing_current()):
+            self._packing_done = self._generate_packing()
+        return self._circles
+#
+#-----------------------------------------------------------------------
+#
+    @circles.setter
+    def circles(self, value):
+        """set circles."""
+
+        self._circles = value
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def termination(self):
+        """ Returns why the last packing stopped: porosity, ngrains_max,
+            ntries_max, trials_max, time_max, jammed, saturated (no room
+            left for the void sampling) or unplaced (largest_first)."""
+        return self._termination
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def estimate(self):
+        """ Returns the estimate of the last random packing: acceptance
+            rate, porosity it converges to (None if it does not seem to
+            converge) and trials and seconds still needed to reach the
+            target (see PyMonitor). Its values are None until enough of
+            the packing has been seen."""
+        return self._estimate
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def porosity(self):
+        """ Returns the porosity reached by the last packing."""
+        return self._porosity
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def checkpoint(self):
+        """ Returns the checkpoint file of the random packing."""
+        return self._checkpoint
+#
+#-----------------------------------------------------------------------
+#
+    @checkpoint.setter
+    def checkpoint(self, value):
+        """ Sets the file (.npz) where the state of the 'rnd' packing is
+            saved every checkpoint_interval seconds, or None (the default)
+            for no checkpoints. The file is replaced atomically, so it
+            always holds a complete state. See resume. Only the serial
+            and batch packings write checkpoints."""
+        if value is None or isinstance(value, str):
+            self._checkpoint = value
+        else:
+            raise PoreError.ErrorCheckpoint
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def checkpoint_interval(self):
+        """ Returns the seconds between checkpoints."""
+        return self._checkpoint_interval
+#
+#-----------------------------------------------------------------------
+#
+    @checkpoint_interval.setter
+    def checkpoint_interval(self, value):
+        """ Sets the seconds between checkpoints."""
+        if value is not None and self._check_budget(value):
+            self._checkpoint_interval = value
+        else:
+            raise PoreError.ErrorCheckpoint
+#
+#-----------------------------------------------------------------------
+#
+    @classmethod
+    def resume(cls, fname):
+        """ Returns the random packing saved in checkpoint fname. Its
+            packing continues from the checkpoint and ends as the
+            packing that was interrupted would have (unless time_max
+            stops it), and it keeps writing checkpoints to fname."""
+
+        import json
+        import PyDistribution
+
+        with np.load(fname) as data:
+            state = dict((key, data[key]) for key in data.files)
+
+        params = json.loads(str(state['params']))
+        pore = cls(lx=params['lx'], ly=params['ly'], rmin=params['rmin'],
+                   rmax=params['rmax'],
+                   target_porosity=params['target_porosity'],
+                   packing='rnd', seed=params['seed'])
+        for key in cls._checkpoint_params[6:]:
+            setattr(pore, key, params[key])
+        # zeta has no setter.
+        pore._zeta = params['zeta']
+        if 'distribution' in state:
+            distribution = json.loads(str(state['distribution']))
+            pore.distribution = PyDistribution.from_params(
+                distribution['name'], distribution['params'])
+
+        pore.checkpoint = fname
+        pore._resume_state = state
+
+        return pore
+#
+#-----------------------------------------------------------------------
+#
+    def extend(self, dx=0., dy=0.):
+        """ Extends the 'rnd' packing by dx along x and dy along y. The
+            grains already packed are kept and only the new strips (and
+            the band left free by the old walls) are packed, until the
+            whole domain reaches the target porosity. Overlaps are only
+            checked against the nearby grains, so the cost grows with
+            the added area. ngrains_max still bounds the total number
+            of grains. A bounding box set by the user is enlarged by dx
+            and dy.
+            Periodic directions and 3D packings cannot be extended."""
+
+        periodic = self._periodic_axes()
+        if self.packing != 'rnd' or self._packs_spheres() or \
+           dx < 0. or dy < 0. or \
+           (dx > 0. and periodic[0]) or (dy > 0. and periodic[1]):
+            raise PoreError.ErrorExtend
+
+        if not self._packing_done:
+            self._packing_done = self._generate_packing()
+
+        # Candidates accepted in the order they are drawn are packed as
+        # one at a time, so batches are used even if batch_size is 1.
+        grains = self._grains
+        reach = self.rmax + self.tolerance
+        nbatch = max(self.batch_size, 64)
+        trials = self._trials
+        if dx > 0.:
+            band = max(0., self.lx - reach)
+            solid = (1. - self._porosity)*self.lx*self.ly
+            self._lx = self.lx + dx
+            self._pack_rnd_batch(grains, region=[[band, self.lx]],
+                                 nbatch=nbatch, solid=solid)
+            trials = trials + self._trials
+        if dy > 0.:
+            band = max(0., self.ly - reach)
+            solid = (1. - self._porosity)*self.lx*self.ly
+            self._ly = self.ly + dy
+            self._pack_rnd_batch(grains, region=[[band, self.ly]], axis=1,
+                                 nbatch=nbatch, solid=solid)
+            trials = trials + self._trials
+
+        self._trials = trials
+        self._packed = self._packing_settings()
+        self._goal = self._packing_goal()
+        self.ngrains = grains.ngrains
+        self.circles = grains.circles
+
+        # lx, ly and the box are set directly: their setters would mark
+        # the packing as changed. A box set by the user is only
+        # enlarged, the default one follows the grains.
+        if self._bbox_set:
+            pmax = list(self._bbox_pmax)
+            pmax[0] = pmax[0] + dx
+            pmax[1] = pmax[1] + dy
+            self._bbox_pmax = pmax
+        self._update_BoundingBox()
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def stats(self):
+        """ Returns the counters of the random packing."""
+        return self._stats
+#
+#-----------------------------------------------------------------------
+#
+    @stats.setter
+    def stats(self, value):
+        """ Sets the counters (PyMonitor.PackingStats) filled while the
+            'rnd' packing runs, or None (the default) for no counters.
+            They are reset at every packing. With nprocs > 1 and
+            parallel 'tiles' only the final serial pass is counted."""
+        if self._check_stats(value):
+            self._stats = value
+        else:
+            raise PoreError.ErrorStats
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def schedule(self):
+        """ Returns the order in which radii are placed by 'rnd'."""
+        return self._schedule
+#
+#-----------------------------------------------------------------------
+#
+    @schedule.setter
+    def schedule(self, value):
+        """ Sets the order in which radii are placed by 'rnd':
+            random -- radius and position are drawn together
+            largest_first -- the radii needed to reach the target
+                             porosity are drawn first and placed from
+                             the largest to the smallest (see unplaced),
+                             always serially: nprocs and parallel are
+                             ignored."""
+        if value in self._schedules:
+            self._schedule = value
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorSchedule
+#
+#-----------------------------------------------------------------------
+#
+    @property
+    def unplaced(self):
+        """ Returns the radii that could not be placed by the last
+            largest_first packing."""
+        return self._unplaced
+#
+#-----------------------------------------------------------------------
 #
     @property
     def packing(self):
@@ -1114,9 +1843,16 @@ class RndPore2D(RecPore2D):
 #
     @packing.setter
     def packing(self, value):
-        """ Sets the packing."""
-        # TODO: Check packing
-        self._packing = value
+        """ Sets the packing:
+            rnd -- random sequential addition
+            ls  -- growth and collective rearrangement
+                   (Lubachevsky-Stillinger like)
+            jt  -- Jodrey-Tory overlap removal"""
+        if value in self._packs:
+            self._packing = value
+            self._packing_done = False
+        else:
+            raise PoreError.ErrorPacking
 #
 #-----------------------------------------------------------------------
 #
@@ -1178,74 +1914,1399 @@ class RndPore2D(RecPore2D):
             It must be an integer greater than zero."""
         return isinstance(ngrains_max, int) and ngrains_max > 0
 
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _check_batch_size(batch_size):
+        """ Checks number of candidates per batch.
+            It must be an integer greater than zero."""
+        return isinstance(batch_size, int) and batch_size > 0
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _check_distribution(distribution):
+        """ Checks the radius distribution.
+            It must be None or a PyDistribution.Distribution."""
+        from PyDistribution import Distribution
+        return distribution is None or isinstance(distribution, Distribution)
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _check_lz(lz):
+        """ Checks depth of the domain.
+            It must be None or greater than zero."""
+        return lz is None or \
+               (isinstance(lz, (int, float)) and \
+                not isinstance(lz, bool) and lz > 0)
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _check_stats(stats):
+        """ Checks the counters.
+            They must be None or a PyMonitor.PackingStats."""
+        from PyMonitor import PackingStats
+        return stats is None or isinstance(stats, PackingStats)
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _check_budget(budget):
+        """ Checks a budget of time or trials.
+            It must be None or greater than zero."""
+        return budget is None or \
+               (isinstance(budget, (int, float)) and \
+                not isinstance(budget, bool) and budget > 0)
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _check_nprocs(nprocs):
+        """ Checks number of processes.
+            It must be an integer greater than zero."""
+        return isinstance(nprocs, int) and nprocs > 0
+
 #
 #-----------------------------------------------------------------------
 #
     def _generate_packing(self):
         """ Generates the position of the grains."""
 
-        if 'rnd' in self.packing:
-            print ("entro en rnd pack")
-            self.circles, self.ngrains, self._circles_done = self._pack_rnd()
-
-        if None in self.bounding_box:
-            self.bounding_box = self._get_BoundingBox()
+        # Only settings that do not change the packing changed.
+        if self.incremental and self._packing_current():
+            return True
+
+        # Every packing of a given seed starts the same stream, while a
+        # continued one keeps drawing from it.
+        grains = self._continued_grains()
+        if grains is None and (self._seed is not None or self._rng is None):
+            self._rng = self._new_rng(0)
+
+        previous = 0
+        if grains is not None:
+            previous = self._trials
+        self._trials = None
+        self._packed = None
+        self._goal = None
+        if self._stats is not None:
+            self._stats.reset()
+
+        # Grains cross the periodic sides.
+        periodic_x, periodic_y = self._periodic_axes()
+        self._walls = (not periodic_x, not periodic_x,
+                       not periodic_y, not periodic_y)
+
+        if self.packing == 'rnd' and self._packs_spheres():
+            self._warn_not_periodic()
+            self._warn_no_checkpoint()
+            self.circles, self.ngrains, self._circles_done = \
+                self._pack_rnd_3D()
+
+        elif self.packing == 'rnd':
+            self.circles, self.ngrains, self._circles_done = \
+                self._pack_rnd(grains)
+            self._trials = previous + self._trials
+
+        elif self.packing == 'ls':
+            self._warn_not_periodic()
+            self._warn_not_3D()
+            self.circles, self.ngrains, self._circles_done = self._pack_ls()
+
+        elif self.packing == 'jt':
+            self._warn_not_periodic()
+            self._warn_not_3D()
+            self.circles, self.ngrains, self._circles_done = self._pack_jt()
+
+        # What the packing was generated for (see incremental).
+        self._packed = self._packing_settings()
+        self._goal = self._packing_goal()
+
+        self._update_BoundingBox()
 
         return True
 #
 #-----------------------------------------------------------------------
 #
-    def _pack_rnd(self):
-        """ Generates the grains for a random packing."""
+    def _pack_rnd(self, grains=None):
+        """ Generates the grains for a random packing. Centers are only
+            drawn where the grain fits inside [0,lx]x[0,ly]. If grains
+            (GrainStore) is given, the packing continues from them."""
 
-        porosity = 1.0
-        ntries = 0
-        ngrains = 0
-        grains = []
-        rg = []
+        if self.schedule == 'largest_first':
+            self._warn_no_checkpoint()
+            return self._pack_rnd_sorted()
+
+        if self.nprocs > 1 and self.parallel == 'shared':
+            return self._pack_rnd_shared(grains)
 
-        from PyGrain import Grain as grain
+        if self.nprocs > 1:
+            self._warn_no_checkpoint()
+            return self._pack_rnd_parallel()
+
+        if self.batch_size > 1:
+            return self._pack_rnd_batch(grains)
+
+        ntries = 0
+        trials = 0
+        tol = self.tolerance
+        rng = self.rng
+
+        # Radii are drawn in blocks.
+        distribution = self._radius_distribution()
+        radii = np.empty(0)
+        nradii = 0
+
+        from PyGrain import GrainStore as grainstore
+        from PyCellList import CellList as celllist
+
+        state = None
+        if grains is None:
+            grains = grainstore(min(self.ngrains_max, 1024))
+            state = self._restore(grains)
+        self._grains = grains
+
+        ngrains = grains.ngrains
+        porosity = 1.0 - np.sum(grains.area)/(self.lx*self.ly)
+        if state is not None:
+            trials, ntries = [int(value) for value in state['counters']]
+            porosity = float(state['porosity'])
+            radii = state['radii']
+            nradii = int(state['nradii'])
+
+        # Only grains closer than rmax + tolerance (plus the radius of
+        # the new grain) can overlap it.
+        cells = celllist(self.lx, self.ly, self.rmax + tol,
+                         periodic=self._periodic_axes())
+        cells.insert_many(np.arange(ngrains), grains.x, grains.y)
+        voids = self._void_grid(cells, grains, state)
+        monitor = self._monitor(state=state)
+        checkpoint = self._next_checkpoint()
+        stats = self._stats
+        if stats is not None:
+            stats.lap()
 
         while porosity > self.target_porosity and \
               ntries < self.ntries_max and \
               ngrains < self.ngrains_max:
 
-            new_grain = grain(rmin=self.rmin, rmax=self.rmax, \
-                              lx=self.lx, ly=self.ly, \
-                              tolerance=self.tolerance)
+            # The radius comes from the block of radii drawn below.
+            if nradii == len(radii):
+                radii = distribution.sample(rng, 1024, self.rmin, self.rmax)
+                nradii = 0
+            r = radii[nradii]
+            nradii = nradii + 1
+            xlo, xhi, ylo, yhi = self._centre_bounds(r)
+            if voids is None:
+                # Center uniform where the grain fits.
+                x = rng.uniform(xlo, xhi)
+                y = rng.uniform(ylo, yhi)
+            else:
+                x, y = voids.sample(1)
+                if len(x) == 0:
+                    break
+                x, y = x[0], y[0]
+            trials = trials + 1
+            if stats is not None:
+                stats.lap('sampling')
+
+            overlaps = x < xlo or x > xhi or y < ylo or y > yhi or \
+                       cells.overlap(x, y, r, grains.x, grains.y,
+                                     grains.radius, tol, r + self.rmax + tol)
+            if stats is not None:
+                stats.lap('overlap')
 
-            if (new_grain.overlap_grains(grains)) or \
-               new_grain.overlap_rectangle([0.,0.] ,[self.lx, self.ly]):
+            if overlaps:
 
                 ntries = ntries + 1
+                if voids is not None:
+                    voids.record(1)
 
             else:
 
-                grains.append(new_grain)
+                grains.append(x, y, self.zeta, r)
+                cells.insert(ngrains, x, y)
+                if voids is not None:
+                    voids.retire(x, y, r)
                 ntries  = 0
                 ngrains = ngrains + 1
-                porosity = porosity - new_grain.area/(self.lx*self.ly)
-                rg = []
+                porosity = porosity - np.pi*r*r/(self.lx*self.ly)
+
+            stop = monitor.update(trials, ngrains, 1.0 - porosity)
+            if stats is not None:
+                stats.lap('bookkeeping')
+                stats.update(trials, ngrains, porosity, cells.ndistances)
+            if stop:
+                break
+
+            if checkpoint is not None and time.perf_counter() >= checkpoint:
+                self._write_checkpoint(grains, monitor, voids, trials,
+                                       ntries, porosity, radii=radii,
+                                       nradii=nradii)
+                checkpoint = self._next_checkpoint()
+
+        self._trials = trials
+        self._finish(monitor, porosity, ngrains, ntries)
+
+        return grains.circles, ngrains, True
+#
+#-----------------------------------------------------------------------
+#
+    def _pack_rnd_batch(self, grains=None, region=None, start=None, axis=0,
+                        nbatch=None, shared=None, solid=None):
+        """ Generates the grains for a random packing drawing
+            nbatch (batch_size by default) candidates at a time.
+            Centers are only drawn where the grain fits inside
+            [0,lx]x[0,ly].
+            If grains (GrainStore) is given, the packing continues from
+            them. If region (list of [min, max] intervals of x, or of y
+            if axis is 1) is given, centers are only drawn inside it and
+            only the grains that can touch it are indexed. solid is the
+            area of grains, if known.
+            The time budget counts from start (time.perf_counter()), if
+            given. If shared (PyParallel.SharedOverlap) is given, the
+            candidates are checked against the packing by its
+            processes."""
+
+        from PyGrain import GrainStore as grainstore
+        from PyCellList import CellList as celllist
+
+        area = self.lx*self.ly
+        tol = self.tolerance
+        reach = 2.*self.rmax + tol
+        rng = self.rng
+        distribution = self._radius_distribution()
+
+        state = None
+        if grains is None:
+            grains = grainstore(min(self.ngrains_max, 1024))
+            state = self._restore(grains)
+        self._grains = grains
+
+        ntries = 0
+        trials = 0
+        ngrains = grains.ngrains
+        if solid is None:
+            solid = np.sum(grains.area)
+        porosity = 1.0 - solid/area
+        if state is not None:
+            trials, ntries = [int(value) for value in state['counters']]
+            porosity = float(state['porosity'])
+
+        cells = celllist(self.lx, self.ly, self.rmax + tol,
+                         periodic=self._periodic_axes())
+        index = np.arange(ngrains)
+        if region is not None:
+            # Candidates in region only reach the grains within reach.
+            coordinate = grains.y if axis == 1 else grains.x
+            near = np.zeros(ngrains, dtype=bool)
+            for lo, hi in region:
+                near |= (coordinate >= lo - reach) & (coordinate <= hi + reach)
+            index = np.flatnonzero(near)
+        cells.insert_many(index, grains.x[index], grains.y[index])
+        overlap_batch = cells.overlap_batch
+        if shared is not None:
+            overlap_batch = shared.attach(cells, grains)
+        voids = None
+        checkpoint = None
+        if region is None:
+            voids = self._void_grid(cells, grains, state)
+            checkpoint = self._next_checkpoint()
+        monitor = self._monitor(start=start, state=state)
+        stats = self._stats
+        if stats is not None:
+            stats.lap()
+
+        done = porosity <= self.target_porosity or \
+               ngrains >= self.ngrains_max
+        if nbatch is None:
+            nbatch = self.batch_size
+        while not done:
+
+            r = distribution.sample(rng, nbatch, self.rmin, self.rmax)
+            xlo, xhi, ylo, yhi = self._centre_bounds(r)
+            if region is not None and axis == 0:
+                x = self._sample_region(region, xlo, xhi)
+                y = rng.uniform(ylo, yhi)
+            elif region is not None:
+                x = rng.uniform(xlo, xhi)
+                y = self._sample_region(region, ylo, yhi)
+            elif voids is None:
+                x = rng.uniform(xlo, xhi)
+                y = rng.uniform(ylo, yhi)
+            else:
+                x, y = voids.sample(nbatch)
+                if len(x) == 0:
+                    break
+            trials = trials + len(x)
+            if stats is not None:
+                stats.lap('sampling')
+
+            fits = (x >= xlo) & (x <= xhi) & (y >= ylo) & (y <= yhi)
+            fits[fits] = ~overlap_batch(x[fits], y[fits], r[fits],
+                                        grains.x, grains.y, grains.radius,
+                                        tol, reach)
+
+            # Candidates that do not overlap the packing nor any
+            # previously accepted candidate of the same batch.
+            ifree = np.flatnonzero(fits)
+            ifree = ifree[self._first_fit(x[ifree], y[ifree], r[ifree],
+                                          tol, reach)]
+            if stats is not None:
+                stats.lap('overlap')
+
+            nkeep, porosity, ntries, done = self._batch_accept(
+                ifree, np.pi*r[ifree]**2., area, porosity, ngrains, ntries,
+                nbatch)
+
+            ifree = ifree[:nkeep]
+            new = grains.append(x[ifree], y[ifree], self.zeta, r[ifree])
+            cells.insert_many(new, x[ifree], y[ifree])
+            if voids is not None:
+                voids.retire(x[ifree], y[ifree], r[ifree])
+                voids.record(nbatch - nkeep)
+            ngrains = ngrains + nkeep
+
+            if not done:
+                done = monitor.update(trials, ngrains, 1.0 - porosity)
+            if stats is not None:
+                stats.lap('bookkeeping')
+                stats.update(trials, ngrains, porosity, cells.ndistances)
+
+            if checkpoint is not None and not done and \
+               time.perf_counter() >= checkpoint:
+                self._write_checkpoint(grains, monitor, voids, trials,
+                                       ntries, porosity)
+                checkpoint = self._next_checkpoint()
+
+        self._trials = trials
+        self._finish(monitor, porosity, ngrains, ntries)
+
+        return grains.circles, ngrains, True
+#
+#-----------------------------------------------------------------------
+#
+    def _pack_rnd_3D(self):
+        """ Generates the spheres of a 3D random packing in
+            [0,lx]x[0,ly]x[0,lz], kept at a distance tolerance from the
+            walls. Candidates are drawn in batches of at least 256 and
+            accepted in the order they were drawn, as in
+            _pack_rnd_batch, so it is the same random sequential
+            addition as one sphere at a time."""
+
+        from PyGrain import GrainStore as grainstore
+        from PyCellList import CellList3D as celllist3d
+
+        volume = self.lx*self.ly*self.lz
+        tol = self.tolerance
+        reach = 2.*self.rmax + tol
+        rng = self.rng
+        distribution = self._radius_distribution()
+        nbatch = max(self.batch_size, 256)
+
+        grains = grainstore(min(self.ngrains_max, 1024))
+        self._grains = grains
+
+        # Cells of side reach: only the 27 cells around a candidate
+        # can hold grains overlapping it.
+        cells = celllist3d(self.lx, self.ly, self.lz, reach)
+        monitor = self._monitor()
+        stats = self._stats
+        if stats is not None:
+            stats.lap()
+
+        ntries = 0
+        trials = 0
+        ngrains = 0
+        porosity = 1.0
+        done = porosity <= self.target_porosity or \
+               ngrains >= self.ngrains_max
+        while not done:
+
+            r = distribution.sample(rng, nbatch, self.rmin, self.rmax)
+            clear = r + tol
+            x = rng.uniform(clear, self.lx - clear)
+            y = rng.uniform(clear, self.ly - clear)
+            z = rng.uniform(clear, self.lz - clear)
+            trials = trials + nbatch
+            if stats is not None:
+                stats.lap('sampling')
+
+            fits = ~cells.overlap_batch(x, y, z, r, grains.x, grains.y,
+                                        grains.z, grains.radius, tol, reach)
+            ifree = np.flatnonzero(fits)
+            ifree = ifree[self._first_fit_3D(x[ifree], y[ifree], z[ifree],
+                                             r[ifree], tol, reach)]
+            if stats is not None:
+                stats.lap('overlap')
+
+            nkeep, porosity, ntries, done = self._batch_accept(
+                ifree, 4.*np.pi*r[ifree]**3./3., volume, porosity, ngrains,
+                ntries, nbatch)
+
+            ifree = ifree[:nkeep]
+            new = grains.append(x[ifree], y[ifree], z[ifree], r[ifree])
+            cells.insert_many(new, x[ifree], y[ifree], z[ifree])
+            ngrains = ngrains + nkeep
+
+            if not done:
+                done = monitor.update(trials, ngrains, 1.0 - porosity)
+            if stats is not None:
+                stats.lap('bookkeeping')
+                stats.update(trials, ngrains, porosity, cells.ndistances)
+
+        self._trials = trials
+        self._finish(monitor, porosity, ngrains, ntries)
+
+        return grains.circles, ngrains, True
+#
+#-----------------------------------------------------------------------
+#
+    def _first_fit_3D(self, x, y, z, r, tolerance, reach):
+        """ Returns which of the spheres, taken in order, can be added
+            without overlapping the spheres accepted before them.
+            Neighbours are found by sorting the spheres by cell (of side
+            reach), so the cost only depends on the number of spheres."""
+
+        nfree = len(x)
+        accepted = np.ones(nfree, dtype=bool)
+        if nfree < 2:
+            return accepted
+
+        # Cells are padded by one layer so that neighbour keys are unique.
+        ix = np.floor(x/reach).astype('int64') + 1
+        iy = np.floor(y/reach).astype('int64') + 1
+        iz = np.floor(z/reach).astype('int64') + 1
+        ny = int(np.ceil(self.ly/reach)) + 3
+        nz = int(np.ceil(self.lz/reach)) + 3
+
+        offsets = [((ix + ox)*ny + iy + oy)*nz + iz + oz \
+                   for ox in (-1, 0, 1) for oy in (-1, 0, 1) \
+                   for oz in (-1, 0, 1)]
+        i, j = self._cell_pairs((ix*ny + iy)*nz + iz, offsets)
+
+        dx = x[i] - x[j]
+        dy = y[i] - y[j]
+        dz = z[i] - z[j]
+        radii_sum = r[i] + r[j] + tolerance
+        conflict = (j < i) & (dx*dx + dy*dy + dz*dz <= radii_sum*radii_sum)
+
+        return self._reject_conflicts(i[conflict], j[conflict], accepted)
+#
+#-----------------------------------------------------------------------
+#
+    def _batch_accept(self, ifree, sizes, domain, porosity, ngrains, ntries,
+                      nbatch):
+        """ Applies the stopping criteria, in the order the grains were
+            drawn, to the free candidates ifree (positions in a batch of
+            nbatch) whose areas (volumes in 3D) are sizes. domain is the
+            area (volume) of the domain. Returns the number of them kept,
+            the porosity, the failures since the last grain kept and if
+            the packing is done."""
+
+        done = False
+        nkeep = len(ifree)
+        failures = np.diff(np.r_[-1 - ntries, ifree]) - 1
+        too_many = np.flatnonzero(failures >= self.ntries_max)
+        if len(too_many) > 0:
+            nkeep = too_many[0]
+            done = True
+
+        poro = porosity - np.cumsum(sizes)/domain
+        reached = np.flatnonzero(poro <= self.target_porosity)
+        if len(reached) > 0 and reached[0] + 1 <= nkeep:
+            nkeep = reached[0] + 1
+            done = True
+
+        if ngrains + nkeep >= self.ngrains_max:
+            nkeep = max(self.ngrains_max - ngrains, 0)
+            done = True
+
+        if nkeep > 0:
+            porosity = poro[nkeep - 1]
+
+        if done and len(too_many) == 0:
+            ntries = 0
+        elif nkeep > 0:
+            ntries = nbatch - 1 - ifree[nkeep - 1]
+        else:
+            ntries = ntries + nbatch
+
+        if ntries >= self.ntries_max:
+            ntries = self.ntries_max
+            done = True
+
+        return nkeep, porosity, ntries, done
+#
+#-----------------------------------------------------------------------
+#
+    def _pack_rnd_sorted(self):
+        """ Generates the grains for a random packing placing the radius
+            population (see _radii_population) largest first. Positions
+            for every radius are drawn in batches whose size doubles
+            after a failed batch, up to 4096 (or batch_size if larger),
+            and halves after a success, never below batch_size. A radius
+            is given up after ntries_max positions, and so are the next
+            ones that are not smaller. Grains are placed one at a time:
+            nprocs and parallel are ignored."""
+
+        from PyGrain import GrainStore as grainstore
+        from PyCellList import CellList as celllist
+
+        area = self.lx*self.ly
+        tol = self.tolerance
+        reach = 2.*self.rmax + tol
+        rng = self.rng
+
+        radii = np.sort(self._radii_population())[::-1]
+
+        grains = grainstore(len(radii))
+        self._grains = grains
+        cells = celllist(self.lx, self.ly, self.rmax + tol,
+                         periodic=self._periodic_axes())
+        voids = self._void_grid(cells, grains)
+
+        monitor = self._monitor(jamming=False)
+        stats = self._stats
+        if stats is not None:
+            stats.lap()
+        stop = False
+        placed = np.zeros(len(radii), dtype=bool)
+        failed = np.inf
+        nbatch = self.batch_size
+        trials = 0
+        ntries = 0
+        porosity = 1.0
 
+        for i, r in enumerate(radii):
+
+            if r >= failed or stop:
+                continue
+
+            xlo, xhi, ylo, yhi = self._centre_bounds(r)
+            ntries = 0
+            while ntries < self.ntries_max:
 
-        print ("ngrains = %d (max= %d)" %(ngrains, self.ngrains_max))
-        print ("porosity = %g (target = %g)" %(porosity, self.target_porosity))
-        print ("ntries = %d (max= %d)" %(ntries, self.ntries_max))
+                m = min(nbatch, self.ntries_max - ntries)
+                if voids is None:
+                    x = rng.uniform(xlo, xhi, m)
+                    y = rng.uniform(ylo, yhi, m)
+                else:
+                    x, y = voids.sample(m)
+                    if len(x) == 0:
+                        break
+                if stats is not None:
+                    stats.lap('sampling')
+
+                fits = (x >= xlo) & (x <= xhi) & (y >= ylo) & (y <= yhi)
+                fits[fits] = ~cells.overlap_batch(x[fits], y[fits],
+                                                  np.full(fits.sum(), r),
+                                                  grains.x, grains.y,
+                                                  grains.radius, tol, reach)
+                ifree = np.flatnonzero(fits)
+                if stats is not None:
+                    stats.lap('overlap')
+
+                if len(ifree) == 0:
+                    ntries = ntries + m
+                    trials = trials + m
+                    nbatch = min(2*nbatch,
+                                 max(self.batch_size, self._sorted_batch_max))
+                    if voids is not None:
+                        voids.record(m)
+                    stop = monitor.update(trials, grains.ngrains,
+                                          1.0 - porosity)
+                    self._count(stats, trials, grains.ngrains, porosity,
+                                cells)
+                    if stop:
+                        break
+                    continue
+
+                k = ifree[0]
+                ntries = ntries + k + 1
+                trials = trials + k + 1
+                nbatch = max(self.batch_size, nbatch//2)
+
+                new = grains.append(x[k], y[k], self.zeta, r)
+                cells.insert_many(new, x[k:k + 1], y[k:k + 1])
+                if voids is not None:
+                    voids.retire(x[k], y[k], r)
+                    voids.record(k)
+                placed[i] = True
+                porosity = porosity - np.pi*r*r/area
+                stop = monitor.update(trials, grains.ngrains, 1.0 - porosity)
+                self._count(stats, trials, grains.ngrains, porosity, cells)
+                break
+
+            if not placed[i]:
+                failed = r
+
+        self._trials = trials
+        self._unplaced = radii[~placed]
+        ngrains = grains.ngrains
+
+        # A radius may be left out without the packing jamming.
+        if monitor.termination is None and porosity > self.target_porosity:
+            monitor.termination = 'unplaced'
+        self._finish(monitor, porosity, ngrains, ntries)
+
+        return grains.circles, ngrains, True
+#
+#-----------------------------------------------------------------------
+#
+    def _pack_rnd_shared(self, grains=None):
+        """ Generates the grains for a random packing checking batches
+            of candidates with nprocs processes. The packing is the one
+            of _pack_rnd_batch."""
+
+        from PyParallel import SharedOverlap as sharedoverlap
+
+        shared = sharedoverlap(self.nprocs)
+        try:
+            ngrains, done = self._pack_rnd_batch(grains, shared=shared)[1:]
+        finally:
+            shared.close()
+
+        # Views of the shared blocks are invalid once they are closed.
+        return self._grains.circles, ngrains, done
+#
+#-----------------------------------------------------------------------
+#
+    def _pack_rnd_parallel(self):
+        """ Generates the grains for a random packing splitting the
+            domain in strips packed by nprocs processes."""
+
+        from PyParallel import pack_rnd_tiles
+
+        # The termination is the one of the final refill.
+        grains = pack_rnd_tiles(self, self.nprocs)
+
+        return grains.circles, grains.ngrains, True
+#
+#-----------------------------------------------------------------------
+#
+    def _pack_ls(self):
+        """ Generates the grains by growth and collective rearrangement,
+            a time-stepped variant of the Lubachevsky-Stillinger
+            algorithm. The radii needed to reach the target porosity are
+            placed at random and overlaps are relaxed at full size. If
+            the grains jam before, the largest size they can be relaxed
+            at is found by bisection (ErrorRelax is raised if there is
+            none). The accepted size is relaxed again to a much smaller
+            overlap, so that shrinking all radii by the same factor to
+            remove what is left does not change the porosity."""
+
+        from PyGrain import GrainStore as grainstore
+
+        tol = self.tolerance
+        rng = self.rng
+        r = self._radii_population()
+        ngrains = len(r)
+
+        x = rng.uniform(r + tol, self.lx - r - tol)
+        y = rng.uniform(r + tol, self.ly - r - tol)
+
+        scale = 1.
+        full = self._ls_relax(x, y, r)
+        if not full:
+
+            smin = 0.
+            smax = 1.
+            good = (x.copy(), y.copy())
+            for _ in range(self._ls_bisections):
+                scale = 0.5*(smin + smax)
+                if self._ls_relax(x, y, scale*r):
+                    smin = scale
+                    good = (x.copy(), y.copy())
+                else:
+                    smax = scale
 
-        circles = np.zeros(ngrains, \
-            dtype={'names':['x', 'y', 'z', 'r'], \
-            'formats':['float64', 'float64', 'float64', 'float64']})
+            # Not even the smallest size tried could be relaxed, so the
+            # grains would be points.
+            if smin == 0.:
+                raise PoreError.ErrorRelax
+
+            scale = smin
+            x, y = good
+
+        # The positions are only kept if they leave less to shrink.
+        fx, fy = x.copy(), y.copy()
+        self._ls_relax(fx, fy, scale*r, self._ls_final_overlap)
+        if self._safe_scale(fx, fy, r) > self._safe_scale(x, y, r):
+            x, y = fx, fy
+
+        # Fewer grains than needed when ngrains_max is reached.
+        solid = (1. - self.target_porosity)*self.lx*self.ly
+        capped = np.sum(np.pi*r*r) < solid
+
+        scale = min(scale, self._safe_scale(x, y, r))
+        r = scale*r
+        porosity = 1. - np.sum(np.pi*r*r)/(self.lx*self.ly)
+
+        self._porosity = porosity
+        self._estimate = None
+        if not full:
+            self._termination = 'jammed'
+        elif capped:
+            self._termination = 'ngrains_max'
+        else:
+            self._termination = 'porosity'
+
+        grains = grainstore(ngrains)
+        grains.append(x, y, self.zeta, r)
+        self._grains = grains
+
+        return grains.circles, ngrains, True
+#
+#-----------------------------------------------------------------------
+#
+    def _ls_relax(self, x, y, r, accepted=None):
+        """ Relaxes the overlaps between grains (in place) minimizing
+            the overlap energy with the FIRE algorithm. A Verlet
+            neighbour list is rebuilt when a grain moves more than half
+            the skin. Returns True when the largest overlap (relative to
+            the sum of radii) is below the accepted one (_ls_overlap by
+            default)."""
+
+        if accepted is None:
+            accepted = self._ls_overlap
+
+        ngrains = len(x)
+        skin = 0.5*r.min()
+        reach = 2.*r.max() + self.tolerance + skin
+
+        vx = np.zeros(ngrains)
+        vy = np.zeros(ngrains)
+        dt = 0.1
+        alpha = 0.1
+        npositive = 0
+
+        i, j = self._pairs(x, y, reach)
+        x0 = x.copy()
+        y0 = y.copy()
+
+        for _ in range(self._ls_max_iters):
+
+            if np.max((x - x0)**2. + (y - y0)**2.) > 0.25*skin*skin:
+                i, j = self._pairs(x, y, reach)
+                x0 = x.copy()
+                y0 = y.copy()
+
+            fx, fy, overlap = self._overlap_forces(x, y, r, i, j)
+            if overlap < accepted:
+                return True
+
+            # FIRE: mixes velocity and force directions while the system
+            # goes downhill, and stops it when it goes uphill.
+            power = np.sum(fx*vx + fy*vy)
+            if power > 0.:
+                fnorm = np.sqrt(np.sum(fx*fx + fy*fy))
+                vnorm = np.sqrt(np.sum(vx*vx + vy*vy))
+                vx = (1. - alpha)*vx + alpha*vnorm*fx/fnorm
+                vy = (1. - alpha)*vy + alpha*vnorm*fy/fnorm
+                npositive = npositive + 1
+                if npositive > 5:
+                    dt = min(1.1*dt, 1.)
+                    alpha = 0.99*alpha
+            else:
+                npositive = 0
+                dt = 0.5*dt
+                alpha = 0.1
+                vx[:] = 0.
+                vy[:] = 0.
+
+            vx += dt*fx
+            vy += dt*fy
+            x += dt*vx
+            y += dt*vy
+
+        return False
+#
+#-----------------------------------------------------------------------
+#
+    def _overlap_forces(self, x, y, r, i, j):
+        """ Returns the forces pushing apart the overlapping pairs (i, j)
+            and the grains crossing the walls, together with the
+            largest relative overlap between grains."""
+
+        tol = self.tolerance
+        ngrains = len(x)
+
+        dx = x[i] - x[j]
+        dy = y[i] - y[j]
+        dist = np.sqrt(dx*dx + dy*dy)
+        overlap = r[i] + r[j] + tol - dist
+
+        touching = overlap > 0.
+        i = i[touching]
+        j = j[touching]
+        overlap = overlap[touching]
+        push = overlap/np.maximum(dist[touching], 1.e-300)
+        mx = push*dx[touching]
+        my = push*dy[touching]
+
+        fx = np.zeros(ngrains)
+        fy = np.zeros(ngrains)
+        fx += np.bincount(i, mx, ngrains) - np.bincount(j, mx, ngrains)
+        fy += np.bincount(i, my, ngrains) - np.bincount(j, my, ngrains)
+
+        fx += np.maximum(r + tol - x, 0.) - \
+              np.maximum(x - self.lx + r + tol, 0.)
+        fy += np.maximum(r + tol - y, 0.) - \
+              np.maximum(y - self.ly + r + tol, 0.)
+
+        largest = 0.
+        if len(overlap) > 0:
+            largest = np.max(overlap/(r[i] + r[j]))
+
+        return fx, fy, largest
+#
+#-----------------------------------------------------------------------
+#
+    def _pack_jt(self):
+        """ Generates the grains with the Jodrey-Tory algorithm.
+            The radii needed to reach the target porosity are placed at
+            random. The inner scale is the smallest ratio between the
+            distance of two grains and the sum of their radii, and the
+            outer scale starts at 1. At each iteration the worst pair
+            (taken from a priority queue) is pushed apart up to the
+            outer scale and the outer scale is slightly reduced, until
+            both scales meet. Only the neighbours of the moved grains
+            are updated. The loop is PyKernels.jt_pack, compiled if
+            numba is available."""
+
+        import PyKernels
+        from PyGrain import GrainStore as grainstore
+
+        tol = self.tolerance
+        rng = self.rng
+        r = self._radii_population()
+        ngrains = len(r)
+        reach = 2.*r.max() + tol
+
+        x = rng.uniform(r + tol, self.lx - r - tol)
+        y = rng.uniform(r + tol, self.ly - r - tol)
+
+        # Without numba the same loop is faster on python floats.
+        if PyKernels.enabled:
+            jt_pack = PyKernels.compiled().jt_pack
+            grains = (x, y, r)
+        else:
+            jt_pack = PyKernels.jt_pack
+            grains = (x.tolist(), y.tolist(), r.tolist())
+
+        outer, inner = jt_pack(grains[0], grains[1], grains[2], self.lx,
+                               self.ly, tol, reach, 1., self._jt_delta/ngrains,
+                               1000*ngrains)[:2]
+        x = np.asarray(grains[0], dtype='float64')
+        y = np.asarray(grains[1], dtype='float64')
+
+        scale = min(outer, inner, self._safe_scale(x, y, r))
+        r = scale*r
+        porosity = 1. - np.sum(np.pi*r*r)/(self.lx*self.ly)
+
+        # Radii are only shrunk (by a negligible factor) when it jams.
+        self._porosity = porosity
+        self._estimate = None
+        if porosity <= self.target_porosity + 1.e-6:
+            self._termination = 'porosity'
+        else:
+            self._termination = 'jammed'
+
+        grains = grainstore(ngrains)
+        grains.append(x, y, self.zeta, r)
+        self._grains = grains
+
+        return grains.circles, ngrains, True
+#
+#-----------------------------------------------------------------------
+#
+    def _pairs(self, x, y, reach):
+        """ Returns the candidate pairs of grains closer than reach."""
+
+        from PyCellList import CellList as celllist
+
+        cells = celllist(self.lx, self.ly, reach)
+        cells.insert_many(np.arange(len(x)), x, y)
+
+        return cells.pairs(x, y, reach)
+#
+#-----------------------------------------------------------------------
+#
+    def _safe_scale(self, x, y, r):
+        """ Returns the largest factor the radii can be multiplied by
+            without any overlap between grains or with the walls."""
+
+        tol = self.tolerance
+        i, j = self._pairs(x, y, 2.*r.max() + tol)
+
+        dist = np.sqrt((x[i] - x[j])**2. + (y[i] - y[j])**2.)
+        wall = np.minimum(np.minimum(x, self.lx - x),
+                          np.minimum(y, self.ly - y))
+
+        # Slightly below the limit so that no pair is left touching.
+        scale = np.min((wall - tol)/r)
+        if len(i) > 0:
+            scale = min(scale, np.min((dist - tol)/(r[i] + r[j])))
+
+        return scale*(1. - 1.e-9)
+#
+#-----------------------------------------------------------------------
+#
+    def _radii_population(self):
+        """ Draws radii until their area fills the solid fraction
+            given by the target porosity (at most ngrains_max)."""
+
+        solid = (1. - self.target_porosity)*self.lx*self.ly
+        distribution = self._radius_distribution()
+        mean_area = distribution.mean_area(self.rmin, self.rmax)
+        nchunk = int(min(self.ngrains_max, solid/mean_area + 16))
+
+        rng = self.rng
+        radii = np.empty(0)
+        total = 0.
+        while total < solid and len(radii) < self.ngrains_max:
+            radii = np.r_[radii, distribution.sample(rng, nchunk, self.rmin,
+                                                     self.rmax)]
+            total = np.sum(np.pi*radii*radii)
 
-        circles[:]['x'] = np.fromiter((grain.x for grain in grains), \
-                                      dtype='float64')
-        circles[:]['y'] = np.fromiter((grain.y for grain in grains), \
-                                      dtype='float64')
-        circles[:]['z'] = np.tile(self.zeta, ngrains)
-        circles[:]['r'] = np.fromiter((grain.radius for grain in grains), \
-                                       dtype='float64')
+        nfill = np.searchsorted(np.cumsum(np.pi*radii*radii), solid) + 1
+
+        return radii[:min(nfill, self.ngrains_max)]
+#
+#-----------------------------------------------------------------------
+#
+    def _centre_bounds(self, r):
+        """ Returns the interval of x and y where the center of a grain
+            of radius r can be. Grains are kept at a distance tolerance
+            from the walls, while open sides (see _walls) can be crossed."""
 
-        return circles, ngrains, True
- #
+        clear = r + self.tolerance
+        left, right, bottom, top = self._walls
+
+        return left*clear, self.lx - right*clear, \
+               bottom*clear, self.ly - top*clear
+#
+#-----------------------------------------------------------------------
+#
+    def _sample_region(self, region, xlo, xhi):
+        """ Draws one coordinate for every lower bound in xlo, in one of
+            the intervals of region chosen with probability proportional
+            to its length, and inside [xlo, xhi]."""
+
+        rng = self.rng
+        region = np.asarray(region, dtype='float64').reshape(-1, 2)
+        length = region[:, 1] - region[:, 0]
+        pick = rng.choice(len(region), len(xlo), p=length/length.sum())
+
+        low = np.maximum(region[pick, 0], xlo)
+        high = np.minimum(region[pick, 1], xhi)
+
+        return rng.uniform(low, np.maximum(low, high))
+#
+#-----------------------------------------------------------------------
+#
+    def _void_grid(self, cells, grains, state=None):
+        """ Returns the grid of cells where new grains are drawn,
+            or None for uniform sampling. state is a checkpoint to
+            continue from."""
+
+        if self.sampling != 'void':
+            return None
+
+        from PyCellList import VoidGrid as voidgrid
+
+        voids = voidgrid(self.lx, self.ly, self.rmin, self.tolerance,
+                         cells, grains, walls=self._walls, rng=self.rng)
+        voids.retire(grains.x, grains.y, grains.radius)
+        if state is not None:
+            voids.restore(self._substate(state, 'voids_'))
+
+        return voids
+#
+#-----------------------------------------------------------------------
+#
+    def _first_fit(self, x, y, r, tolerance, reach):
+        """ Returns which of the discs, taken in order, can be added
+            without overlapping the discs accepted before them.
+            Neighbours are found by sorting the discs by cell (of side
+            reach) as in _first_fit_3D, so the cost only depends on the
+            number of discs, not on the size of the domain."""
+
+        nfree = len(x)
+        accepted = np.ones(nfree, dtype=bool)
+        if nfree < 2:
+            return accepted
+
+        # Along a periodic direction the cells wrap around and are
+        # stretched to fit the length, as in CellList. Otherwise they
+        # are padded by one layer so that neighbour keys are unique.
+        periodic_x, periodic_y = self._periodic_axes()
+        if periodic_x:
+            nx = max(1, int(self.lx//reach))
+            ix = np.floor(x*nx/self.lx).astype('int64') % nx
+        else:
+            ix = np.floor(x/reach).astype('int64') + 1
+        if periodic_y:
+            ny = max(1, int(self.ly//reach))
+            iy = np.floor(y*ny/self.ly).astype('int64') % ny
+        else:
+            ny = int(np.ceil(self.ly/reach)) + 3
+            iy = np.floor(y/reach).astype('int64') + 1
+
+        offsets = []
+        for ox in (-1, 0, 1):
+            jx = (ix + ox) % nx if periodic_x else ix + ox
+            for oy in (-1, 0, 1):
+                jy = (iy + oy) % ny if periodic_y else iy + oy
+                offsets.append(jx*ny + jy)
+        i, j = self._cell_pairs(ix*ny + iy, offsets)
+
+        dx = x[i] - x[j]
+        dy = y[i] - y[j]
+        if periodic_x:
+            dx = dx - self.lx*np.round(dx/self.lx)
+        if periodic_y:
+            dy = dy - self.ly*np.round(dy/self.ly)
+        radii_sum = r[i] + r[j] + tolerance
+        conflict = (j < i) & (dx*dx + dy*dy <= radii_sum*radii_sum)
+
+        return self._reject_conflicts(i[conflict], j[conflict], accepted)
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _cell_pairs(keys, neighbour_keys):
+        """ Returns the pairs (i, j) of points such that j lies in one of
+            the cells neighbour_keys[k][i]. keys are the cells of the
+            points and neighbour_keys a list of arrays of cells, one per
+            neighbour. The points are sorted by cell once and every
+            neighbour cell is found by bisection."""
+
+        nfree = len(keys)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+
+        first = []
+        second = []
+        for key in neighbour_keys:
+            lo = np.searchsorted(keys, key, 'left')
+            sizes = np.searchsorted(keys, key, 'right') - lo
+            start = np.repeat(lo - np.cumsum(np.r_[0, sizes[:-1]]), sizes)
+            first.append(np.repeat(np.arange(nfree), sizes))
+            second.append(order[start + np.arange(sizes.sum())])
+
+        return np.concatenate(first), np.concatenate(second)
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _reject_conflicts(i, j, accepted):
+        """ Sequential part of the batch acceptance: candidate i is
+            rejected if any of the candidates j < i it conflicts with
+            was accepted. Returns accepted."""
+
+        import PyKernels
+
+        order = np.argsort(i, kind='stable')
+        i = i[order]
+        j = j[order]
+        if PyKernels.enabled:
+            PyKernels.compiled().first_fit(i, j, accepted)
+            return accepted
+
+        bounds = np.r_[0, np.flatnonzero(np.diff(i)) + 1, len(i)]
+        for k in range(len(bounds) - 1):
+            if accepted[j[bounds[k]:bounds[k + 1]]].any():
+                accepted[i[bounds[k]]] = False
+
+        return accepted
+#
+#-----------------------------------------------------------------------
+#
+    def _monitor(self, jamming=None, start=None, state=None):
+        """ Returns the monitor (PyMonitor) of a random packing.
+            state is a checkpoint to continue from."""
+
+        from PyMonitor import PackingMonitor as packingmonitor
+
+        if jamming is None:
+            jamming = self.jamming
+
+        monitor = packingmonitor(1.0 - self.target_porosity,
+                                 ntries_max=self.ntries_max,
+                                 trials_max=self.trials_max,
+                                 time_max=self.time_max, jamming=jamming,
+                                 start=start)
+        if state is not None:
+            monitor.restore(self._substate(state, 'monitor_'))
+
+        return monitor
+#
+#-----------------------------------------------------------------------
+#
+    def _packing_settings(self):
+        """ Returns the settings a continued 'rnd' packing must keep."""
+
+        return (self.lx, self.ly, self.rmin, self.rmax, self.tolerance,
+                self.distribution, self.zeta, self._periodic_axes(),
+                self.seed, self._rng, self.packing, self.schedule,
+                self.is3D, self.lz)
+#
+#-----------------------------------------------------------------------
+#
+    def _packing_goal(self):
+        """ Returns the settings that ask a 'rnd' packing for more
+            grains."""
+
+        return (self.target_porosity, self.ngrains_max, self.ntries_max)
+#
+#-----------------------------------------------------------------------
+#
+    def _packing_current(self):
+        """ Checks if the packing was generated with the current
+            settings and goal."""
+
+        return self._circles_done and self._packed is not None and \
+               self._packed == self._packing_settings() and \
+               self._goal == self._packing_goal()
+#
+#-----------------------------------------------------------------------
+#
+    def _continued_grains(self):
+        """ Returns the grains (GrainStore) of the last packing if the
+            next one continues from them (see incremental), else None."""
+
+        if not self.incremental or self._packed is None or \
+           self._grains is None or self.packing != 'rnd' or \
+           self._packs_spheres() or \
+           self.schedule != 'random' or \
+           (self.nprocs > 1 and self.parallel == 'tiles') or \
+           self._packed != self._packing_settings() or \
+           self._goal == self._packing_goal() or \
+           self._termination in ('jammed', 'ntries_max'):
+            return None
+
+        grains = self._grains
+        porosity = 1.0 - np.sum(grains.area)/(self.lx*self.ly)
+        if grains.ngrains > self.ngrains_max or \
+           porosity < self.target_porosity:
+            return None
+
+        return grains
+#
+#-----------------------------------------------------------------------
+#
+    def _next_checkpoint(self):
+        """ Returns when the next checkpoint is due (time.perf_counter()),
+            or None without checkpoints."""
+
+        if self.checkpoint is None:
+            return None
+
+        return time.perf_counter() + self.checkpoint_interval
+#
+#-----------------------------------------------------------------------
+#
+    def _write_checkpoint(self, grains, monitor, voids, trials, ntries,
+                          porosity, **extra):
+        """ Saves the state of the random packing to checkpoint: the
+            parameters, grains, random stream, counters, monitor and void
+            grid, plus the extra arrays of the packing loop. It is
+            written to a temporary file that then replaces checkpoint."""
+
+        import os
+        import json
+        import PyDistribution
+
+        state = dict(extra)
+        params = dict((key, getattr(self, key)) \
+                      for key in self._checkpoint_params)
+        params['zeta'] = self.zeta
+        state['params'] = json.dumps(params)
+        # Saved as data, not pickled, so that loading a checkpoint runs
+        # no code. Only the distributions of PyDistribution can be saved.
+        distribution = self.distribution
+        if distribution is not None:
+            name = type(distribution).__name__
+            if getattr(PyDistribution, name, None) is not type(distribution):
+                raise PoreError.ErrorDistribution
+            state['distribution'] = json.dumps(
+                {'name':name, 'params':distribution.params()})
+        state['rng'] = json.dumps(self.rng.bit_generator.state)
+        state['x'] = grains.x
+        state['y'] = grains.y
+        state['r'] = grains.radius
+        state['counters'] = np.array([trials, ntries])
+        state['porosity'] = porosity
+        for key, value in monitor.state().items():
+            state['monitor_' + key] = value
+        if voids is not None:
+            for key, value in voids.state().items():
+                state['voids_' + key] = value
+
+        temporary = self.checkpoint + '.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez(f, **state)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.checkpoint)
+#
+#-----------------------------------------------------------------------
+#
+    def _restore(self, grains):
+        """ Continues from the checkpoint given to resume, if any: the
+            random stream is set back and its grains are added to grains
+            (GrainStore). Returns the checkpoint, or None."""
+
+        import json
+
+        state = self._resume_state
+        self._resume_state = None
+        if state is None:
+            return None
+
+        self.rng.bit_generator.state = json.loads(str(state['rng']))
+        grains.append(state['x'], state['y'], self.zeta, state['r'])
+
+        return state
+#
+#-----------------------------------------------------------------------
+#
+    @staticmethod
+    def _substate(state, prefix):
+        """ Returns the entries of state starting with prefix, without it."""
+
+        return dict((key[len(prefix):], state[key]) for key in state \
+                    if key.startswith(prefix))
+#
+#-----------------------------------------------------------------------
+#
+    def _warn_no_checkpoint(self):
+        """ Warns that this random packing does not write checkpoints."""
+
+        if self.checkpoint is not None:
+            warnings.warn("Checkpoints are only written by the serial " + \
+                          "and batch 2D 'rnd' packings.")
+#
+#-----------------------------------------------------------------------
+#
+    def _finish(self, monitor, porosity, ngrains, ntries):
+        """ Records why the random packing stopped and its estimate."""
+
+        if monitor.termination is None:
+            if porosity <= self.target_porosity:
+                monitor.termination = 'porosity'
+            elif ngrains >= self.ngrains_max:
+                monitor.termination = 'ngrains_max'
+            elif ntries >= self.ntries_max:
+                monitor.termination = 'ntries_max'
+            else:
+                monitor.termination = 'saturated'
+
+        self._termination = monitor.termination
+        self._estimate = monitor.estimate
+        self._porosity = porosity
+        if self._stats is not None:
+            self._stats.finish(monitor.termination)
+#
+#-----------------------------------------------------------------------
+#
+    def _count(self, stats, trials, ngrains, porosity, cells):
+        """ Closes the bookkeeping lap and updates the counters, if any."""
+
+        if stats is not None:
+            stats.lap('bookkeeping')
+            stats.update(trials, ngrains, porosity, cells.ndistances)
+#
+#-----------------------------------------------------------------------
+#
+    def _radius_distribution(self):
+        """ Returns the radius distribution (uniform by default)."""
+
+        if self.distribution is None:
+            from PyDistribution import Uniform
+            return Uniform()
+
+        return self.distribution
+#
+#-----------------------------------------------------------------------
+#
+    def _periodic_axes(self):
+        """ Returns which directions (x, y) are periodic."""
+
+        return self.isPeriodicX, self.isPeriodic
+#
+#-----------------------------------------------------------------------
+#
+    def _warn_not_periodic(self):
+        """ Warns that the packing ignores periodicity."""
+
+        if self.isPeriodicX or self.isPeriodic:
+            warnings.warn("Only 2D 'rnd' packings can be periodic.")
+#
+#-----------------------------------------------------------------------
+#
+    def _warn_not_3D(self):
+        """ Warns that the packing ignores the depth."""
+
+        if self.is3D and self.lz is not None:
+            warnings.warn("Only 'rnd' packings can be 3D.")
+#
+#-----------------------------------------------------------------------
+#
+    def _packs_spheres(self):
+        """ Checks if the packing is a 3D 'rnd' packing of spheres."""
+
+        return self.packing == 'rnd' and self.is3D and self.lz is not None
+#
+#-----------------------------------------------------------------------
+#
+    def _mesh_circles(self):
+        """ Returns the circles written by the exporters: the grains
+            and, along periodic sides, their periodic images."""
+
+        periodic_x, periodic_y = self._periodic_axes()
+        if (periodic_x or periodic_y) and not self._packs_spheres():
+            return self._periodic_images(self._circles)
+
+        return self._circles
+#
+#-----------------------------------------------------------------------
+#
+    def _periodic_images(self, circles):
+        """ Appends to circles the periodic images of the grains crossing
+            the periodic sides, so that exporters see every grain cut by
+            the domain."""
+
+        periodic_x, periodic_y = self._periodic_axes()
+        x = circles['x']
+        y = circles['y']
+        r = circles['r']
+
+        shift_x = [0.]
+        shift_y = [0.]
+        if periodic_x:
+            shift_x = [0., self.lx, -self.lx]
+        if periodic_y:
+            shift_y = [0., self.ly, -self.ly]
+
+        images = [circles]
+        for dx in shift_x:
+            for dy in shift_y:
+                if dx == 0. and dy == 0.:
+                    continue
+                crosses = (x + dx - r < self.lx) & (x + dx + r > 0.) & \
+                          (y + dy - r < self.ly) & (y + dy + r > 0.)
+                image = np.array(circles[crosses])
+                image['x'] = image['x'] + dx
+                image['y'] = image['y'] + dy
+                images.append(image)
+
+        return np.concatenate(images)
+#
 #-----------------------------------------------------------------------
 #
     def _get_BoundingBox(self):
@@ -1260,6 +3321,17 @@ class RndPore2D(RecPore2D):
             rmin = np.min(self.circles[:]['r'])
             zmin = self.zeta - rmax
             zmax = self.zeta + rmin
+            if self._packs_spheres():
+                zmin = np.min(self.circles[:]['z'] - self.circles[:]['r'])
+                zmax = np.max(self.circles[:]['z'] + self.circles[:]['r'])
+
+            # A periodic domain is cut exactly at its sides.
+            periodic_x, periodic_y = self._periodic_axes()
+            if periodic_x:
+                xmin, xmax = 0.0, self.lx
+            if periodic_y:
+                ymin, ymax = 0.0, self.ly
+
             pmin = [xmin, ymin, zmin]
             pmax = [xmax, ymax, zmax]
         else:
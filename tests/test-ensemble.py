@@ -0,0 +1,18 @@
+# Test for an ensemble of RndPore2D realisations.
+
+from RecPore2D import RndPore2D as rndp
+
+params = {'lx':1., 'ly':1., 'rmin':0.01, 'rmax':0.05,
+          'target_porosity':0.4, 'packing':'rnd',
+          'ngrains_max':5000, 'batch_size':64, 'size':0.001}
+
+# The guard is needed by the process pool on platforms that spawn workers.
+if __name__ == '__main__':
+
+    summaries = rndp.ensemble(params, 8, seed=2024, nprocs=4,
+                              fname='ens-{:02d}.geo', meshtype='gmsh')
+
+    for s in summaries:
+        print ("%d seed=%d porosity=%g ngrains=%d trials=%d time=%.2fs" \
+               %(s['index'], s['seed'], s['porosity'], s['ngrains'],
+                 s['trials'], s['time']))
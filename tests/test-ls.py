@@ -0,0 +1,11 @@
+# Test for RndPore2D with growth and collective rearrangement.
+
+from RecPore2D import RndPore2D as rndp
+a = rndp(lx=1., ly=1., rmin=0.01, rmax=0.03, target_porosity=0.25, packing='ls')
+a.ngrains_max = 5000
+a.size = 0.001
+pmin = [0.0, 0.0, 0.5]
+pmax = [1.0, 1.0, 1.5]
+a.bounding_box = [pmin, pmax]
+
+a.write_mesh(fname='ls.geo', meshtype='gmsh')
@@ -13,3 +13,28 @@ b.ly = 1.0
 b.size = 0.8*a.throat
 b.write_mesh(fname='b.geo', meshtype='gmsh')
 
+
+# Random packing periodic in x and y. Grains crossing the sides are
+# written together with their periodic images.
+from RecPore2D import RndPore2D as rnd
+c = rnd(lx=1., ly=1., rmin=0.02, rmax=0.05, target_porosity=0.5, seed=1)
+c.isPeriodic = True
+c.isPeriodicX = True
+c.write_mesh(fname='c', meshtype='snappy')
+
+# Only the OpenCASCADE output can cut the grains with the sides; the
+# 'gmsh' output refuses them.
+import PoreError
+c.size = 0.01
+c.write_mesh(fname='c-occ.geo', meshtype='gmsh_occ')
+try:
+    c.write_mesh(fname='c.geo', meshtype='gmsh')
+except PoreError.ErrorGmshBox:
+    pass
+
+# The images are not grains: joining media keeps one copy of each.
+d = rnd(lx=1., ly=1., rmin=0.02, rmax=0.05, target_porosity=0.5, seed=2)
+d.size = 0.01
+d.xoffset = 1.1
+e = c + d
+assert e.ngrains == len(e.circles) == c.ngrains + d.ngrains
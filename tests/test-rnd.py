@@ -2,11 +2,39 @@
 
 from RecPore2D import RndPore2D as rndp
 a = rndp(lx=1., ly=1., rmin=0.01, rmax=0.05, target_porosity=0.4, packing='rnd')
+# Also bounds the grains of the extended packing below.
+a.ngrains_max = 10000
 a.size = 0.001
 pmin = [0.0, 0.0, 0.5]
 pmax = [1.0, 1.0, 1.5]
 a.bounding_box = [pmin, pmax]
 
 a.write_mesh(fname='rnd.geo', meshtype='gmsh')
+# Same geometry, with the discs written as a table gmsh loops over.
+a.write_mesh(fname='rnd-compact.geo', meshtype='gmsh_compact')
 
+# Nodes of every arc set from its radius, between 3 and 20.
+a.transfinite = (3, 20)
+a.write_mesh(fname='rnd-adaptive.geo', meshtype='gmsh')
+a.transfinite = None
 
+# Longer channel made from the packing above: only the added strip
+# [1, 3]x[0, 1] is packed.
+circles = a.circles.copy()
+a.extend(dx=2.)
+assert (a.circles[:len(circles)] == circles).all()
+a.write_mesh(fname='rnd-extended.geo', meshtype='gmsh')
+
+# Incremental packing: a lower target porosity continues the packing,
+# a higher one generates it again. The default box follows the grains
+# every time, so the 'gmsh' output never finds them crossing it.
+b = rndp(lx=1., ly=1., rmin=0.01, rmax=0.05, target_porosity=0.6, seed=3)
+b.size = 0.01
+b.incremental = True
+for porosity in [0.6, 0.5, 0.55]:
+    b.target_porosity = porosity
+    circles = b.circles
+    pmin, pmax = b.bounding_box
+    assert min(circles['x'] - circles['r']) >= pmin[0] and \
+           max(circles['x'] + circles['r']) <= pmax[0]
+    b.write_mesh(fname='rnd-incremental.geo', meshtype='gmsh')
@@ -13,5 +13,16 @@ a.write_mesh(meshtype='snappy')
 a.write_mesh(fname='rnd3D.geo', meshtype='gmsh')
 a.write_mesh(fname='rnd3D.stl', meshtype='stl')
 
+# Packing of spheres in the box [0,1]x[0,1]x[0,1].
+b = rndp(lx=1., ly=1., rmin=0.04, rmax=0.06, target_porosity=0.8, seed=1)
+b.is3D = True
+b.lz = 1.
+b.batch_size = 1024
+b.write_mesh(meshtype='snappy')
+
 
  
+
+# OpenCASCADE geometry: the spheres are removed from the box.
+b.size = 0.02
+b.write_mesh(fname='rnd3D-occ.geo', meshtype='gmsh_occ')